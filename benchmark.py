@@ -0,0 +1,364 @@
+# -*- coding: UTF-8 -*-
+"""性能测试
+
+suite: 生成指定规模的配置, 测量加载、构建目录树、编辑后保存、生成计划、
+       应用与增量重新应用的耗时和峰值内存, 结果保存为JSON并可与基线比较:
+
+    python benchmark.py suite --depth 4 --fanout 8 --icon-density 0.1 --output bench.json
+    python benchmark.py suite --baseline bench.json --tolerance 0.2
+
+parallel: 比较串行与线程池并发两种执行方式在本地临时目录 (优先使用tmpfs)
+          和模拟高延迟文件系统上的耗时:
+
+    python benchmark.py parallel --depth 4 --fanout 8 --jobs 8 --latency 0.002
+
+startup: 在新进程中测量冷启动耗时 (导入模块、列出并统计配置文件、创建主窗口),
+         分别测量没有和已有配置列表缓存的情况:
+
+    python benchmark.py startup --configs 300 --depth 3 --fanout 10
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+from main import (
+    FolderModel, IconCache, Manifest, NodeStore, RecordingBackend, compile_plan, create_folders,
+    execute_plan, write_json_atomic,
+)
+
+
+class LatencyBackend(RecordingBackend):
+    """为每次文件系统调用注入固定延迟, 模拟网络共享或慢速磁盘"""
+
+    def __init__(self, latency: float):
+        super().__init__()
+        self.latency = latency
+
+    def makedirs(self, path):
+        time.sleep(self.latency)
+        return super().makedirs(path)
+
+    def copy_file(self, src, dest):
+        time.sleep(self.latency)
+        return super().copy_file(src, dest)
+
+    def write_text(self, path, content, *args, **kwargs):
+        time.sleep(self.latency)
+        super().write_text(path, content, *args, **kwargs)
+
+
+def generate_config(depth: int, fanout: int, icon_density: float = 0.0,
+                    icons: Optional[List[str]] = None, seed: int = 0) -> Dict:
+    """生成合成配置: 每层fanout个子目录, 按icon_density的比例为目录设置图标"""
+    rng = random.Random(seed)
+    icons = icons or []
+    folders: Dict = {}
+    stack = [(folders, depth)]
+    while stack:
+        content, remaining = stack.pop()
+        if remaining == 0:
+            continue
+        for i in range(fanout):
+            child: Dict = {}
+            if icons and rng.random() < icon_density:
+                child['_icon'] = rng.choice(icons)
+            content[f"dir_{i:03d}"] = child
+            stack.append((child, remaining - 1))
+    return {'folders': folders}
+
+
+def make_icons(directory: str, count: int) -> List[str]:
+    """生成用于测试的PNG图标, 未安装PIL时返回空列表"""
+    try:
+        from PIL import Image
+    except ImportError:
+        print("未安装PIL, 跳过图标相关的测试", file=sys.stderr)
+        return []
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"icon_{i}.png")
+        Image.new('RGBA', (256, 256), (40 * i % 256, 120, 200, 255)).save(path)
+        paths.append(path)
+    return paths
+
+
+def _scratch_root() -> str:
+    """优先在tmpfs上创建临时目录"""
+    shm = '/dev/shm'
+    return tempfile.mkdtemp(prefix='filestree-bench-', dir=shm if os.path.isdir(shm) else None)
+
+
+def measure(func: Callable[[], None], repeat: int = 1, memory: bool = True,
+            setup: Optional[Callable[[], None]] = None) -> Dict:
+    """多次运行取最短耗时, 另外单独运行一次统计峰值内存"""
+    best = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    result = {'seconds': round(best, 6)}
+    if memory:
+        if setup is not None:
+            setup()
+        tracemalloc.start()
+        try:
+            func()
+            result['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def _tree_build_stage(config_path: str):
+    """返回测量图形界面加载配置并构建目录树的函数, 无法创建窗口时返回None"""
+    try:
+        import main
+        main._load_gui_modules()
+        root = main.tk.Tk()
+        root.withdraw()
+    except Exception as e:
+        print(f"无法创建窗口, 跳过目录树测试: {e}", file=sys.stderr)
+        return None, None
+    app = main.ConfigEditorGUI(root)
+
+    def build():
+        app._load_config_file(config_path)
+        # 展开根节点和第一层, 模拟打开配置后的首次浏览
+        top = app.tree.get_children('')[0]
+        app._populate_children(top)
+        for item in app.tree.get_children(top):
+            app._populate_children(item)
+        root.update_idletasks()
+
+    def close():
+        app._saver.close()
+        root.destroy()
+    return build, close
+
+
+def run_suite(args) -> Dict:
+    """运行完整的性能测试, 返回结果字典"""
+    scratch = _scratch_root()
+    try:
+        icons = make_icons(os.path.join(scratch, 'icons'), args.icons) if args.icon_density else []
+        data = generate_config(args.depth, args.fanout, args.icon_density, icons, args.seed)
+        config_path = os.path.join(scratch, 'layout.json')
+        with open(config_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=4, ensure_ascii=False)
+        folders = data['folders']
+        target = os.path.join(scratch, 'target')
+        cache_dir = os.path.join(scratch, 'cache')
+        results = {}
+
+        def load():
+            with open(config_path, 'r', encoding='utf-8') as f:
+                FolderModel.from_config(json.load(f))
+        results['load'] = measure(load, args.repeat, args.memory)
+        results['load_compact'] = measure(lambda: NodeStore.load(config_path), args.repeat, args.memory)
+
+        build, close = _tree_build_stage(config_path)
+        if build is not None:
+            try:
+                results['tree_build'] = measure(build, args.repeat, args.memory)
+            finally:
+                close()
+
+        model = FolderModel(folders)
+        def edit_save():
+            node = model.add_child(model.root, f"edit_{time.perf_counter_ns()}")
+            write_json_atomic(config_path, model.to_config(), indent=4)
+            model.remove(node)
+        results['edit_save'] = measure(edit_save, args.repeat, args.memory)
+
+        def plan():
+            compile_plan(target, folders, Manifest(target), IconCache(cache_dir))
+        results['plan'] = measure(plan, args.repeat, args.memory)
+
+        def reset_target():
+            shutil.rmtree(target, ignore_errors=True)
+
+        def apply():
+            create_folders(target, folders, IconCache(cache_dir), RecordingBackend(),
+                           incremental=False, jobs=args.jobs)
+        results['apply'] = measure(apply, args.repeat, args.memory, setup=reset_target)
+
+        def reapply():
+            create_folders(target, folders, IconCache(cache_dir), RecordingBackend(), jobs=args.jobs)
+        results['reapply'] = measure(reapply, args.repeat, args.memory)
+
+        node_count = sum(args.fanout ** d for d in range(1, args.depth + 1))
+        return {
+            'params': {
+                'depth': args.depth, 'fanout': args.fanout, 'icon_density': args.icon_density,
+                'icons': len(icons), 'jobs': args.jobs, 'seed': args.seed, 'nodes': node_count,
+            },
+            'environment': {'python': platform.python_version(), 'platform': platform.platform()},
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'results': results,
+        }
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def compare(current: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """与基线比较, 返回超出容差的退化项"""
+    regressions = []
+    if current['params'] != baseline.get('params'):
+        print("注意: 测试参数与基线不同, 比较结果仅供参考", file=sys.stderr)
+    for stage, result in current['results'].items():
+        base = baseline.get('results', {}).get(stage)
+        if not base:
+            continue
+        for metric in ('seconds', 'peak_bytes'):
+            if metric in result and base.get(metric):
+                ratio = result[metric] / base[metric]
+                if ratio > 1 + tolerance:
+                    regressions.append(f"{stage}.{metric}: {base[metric]} -> {result[metric]} ({ratio:.2f}x)")
+    return regressions
+
+
+def time_apply(folders: Dict, jobs: int, latency: float = 0.0) -> float:
+    """在临时目录上完整应用一次配置, 返回耗时(秒)"""
+    root = _scratch_root()
+    try:
+        backend = LatencyBackend(latency) if latency else RecordingBackend()
+        plan = compile_plan(root, folders)
+        start = time.perf_counter()
+        execute_plan(plan, backend=backend, jobs=jobs)
+        return time.perf_counter() - start
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def run_parallel(args) -> None:
+    """比较串行与并发执行的耗时"""
+    folders = generate_config(args.depth, args.fanout)['folders']
+    count = sum(args.fanout ** d for d in range(1, args.depth + 1))
+    print(f"目录数: {count}")
+
+    for label, latency in (('tmpfs', 0.0), (f'延迟 {args.latency * 1000:g}ms', args.latency)):
+        serial = time_apply(folders, 1, latency)
+        parallel = time_apply(folders, args.jobs, latency)
+        print(f"{label:>12}: 串行 {serial:.3f}s, 并发({args.jobs}) {parallel:.3f}s, "
+              f"加速 {serial / parallel:.2f}x")
+
+
+# 在子进程中运行, 输出各阶段耗时(秒)的JSON
+STARTUP_SCRIPT = """
+import json, time
+start = time.perf_counter()
+import main
+result = {'import': time.perf_counter() - start}
+catalog = main.ConfigCatalog()
+names, stale = catalog.scan()
+for name in stale:
+    catalog.update(name, catalog.summarize(name))
+catalog.save()
+result['config_list'] = time.perf_counter() - start - result['import']
+result['stale'] = len(stale)
+try:
+    main._load_gui_modules()
+    root = main.tk.Tk()
+except Exception:
+    pass
+else:
+    app = main.ConfigEditorGUI(root)
+    root.update()
+    result['window'] = time.perf_counter() - start - result['import'] - result['config_list']
+    app._saver.close()
+    root.destroy()
+result['total'] = time.perf_counter() - start
+print(json.dumps(result))
+"""
+
+
+def run_startup(args) -> None:
+    """在包含大量配置文件的目录中测量冷启动耗时"""
+    scratch = _scratch_root()
+    try:
+        for i in range(args.configs):
+            data = generate_config(args.depth, args.fanout, seed=i)
+            with open(os.path.join(scratch, f"config_{i:04d}.json"), 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=4, ensure_ascii=False)
+        env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+        for label in ('无缓存', '有缓存'):
+            start = time.perf_counter()
+            output = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT], cwd=scratch, env=env,
+                                    capture_output=True, text=True, check=True).stdout
+            elapsed = time.perf_counter() - start
+            result = json.loads(output)
+            stages = ', '.join(f"{key} {value * 1000:.0f}ms" for key, value in result.items()
+                               if key not in ('stale', 'total'))
+            print(f"{label}: 进程总耗时 {elapsed * 1000:.0f}ms ({stages}, 重新统计 {result['stale']} 个文件)")
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="目录图标工具性能测试")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    suite = sub.add_parser('suite', help="测量加载、构建、保存、计划与应用的耗时和内存")
+    suite.add_argument('--depth', type=int, default=4)
+    suite.add_argument('--fanout', type=int, default=8)
+    suite.add_argument('--icon-density', type=float, default=0.1, help="设置图标的目录比例")
+    suite.add_argument('--icons', type=int, default=5, help="生成的不同图标数量")
+    suite.add_argument('--jobs', type=int, default=1)
+    suite.add_argument('--repeat', type=int, default=3)
+    suite.add_argument('--seed', type=int, default=0)
+    suite.add_argument('--no-memory', dest='memory', action='store_false', help="不统计峰值内存")
+    suite.add_argument('--output', help="保存结果的JSON文件")
+    suite.add_argument('--baseline', help="用于比较的基线结果")
+    suite.add_argument('--tolerance', type=float, default=0.2, help="允许的退化比例")
+
+    parallel = sub.add_parser('parallel', help="比较串行与并发目录创建的耗时")
+    parallel.add_argument('--depth', type=int, default=4)
+    parallel.add_argument('--fanout', type=int, default=8)
+    parallel.add_argument('--jobs', type=int, default=8)
+    parallel.add_argument('--latency', type=float, default=0.002, help="模拟文件系统每次调用的延迟(秒)")
+
+    startup = sub.add_parser('startup', help="测量冷启动与配置列表加载耗时")
+    startup.add_argument('--configs', type=int, default=300, help="生成的配置文件数量")
+    startup.add_argument('--depth', type=int, default=3)
+    startup.add_argument('--fanout', type=int, default=10)
+
+    args = parser.parse_args()
+    if args.command == 'parallel':
+        run_parallel(args)
+        return 0
+    if args.command == 'startup':
+        run_startup(args)
+        return 0
+
+    result = run_suite(args)
+    for stage, values in result['results'].items():
+        memory = f", 峰值内存 {values['peak_bytes'] / 1024 / 1024:.1f}MB" if 'peak_bytes' in values else ''
+        print(f"{stage:>12}: {values['seconds']:.4f}s{memory}")
+    if args.output:
+        write_json_atomic(args.output, result, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"退化: {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
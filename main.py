@@ -1,14 +1,672 @@
 # -*- coding: UTF-8 -*-
 
 import os
-import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog
+import sys
 import json
-from typing import Dict, Optional
-from PIL import Image
-import subprocess
-import shutil
-from PIL import ImageTk
+import bisect
+import logging
+import hashlib
+import threading
+import fnmatch
+import itertools
+import re
+from collections import OrderedDict
+from contextlib import contextmanager
+from types import MappingProxyType
+import queue
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+logger = logging.getLogger('filestree')
+
+# 图形界面依赖在启动界面时才导入, 命令行模式不加载tkinter;
+# PIL只在首次显示图标时导入, 不影响启动时间
+tk = ttk = messagebox = simpledialog = filedialog = None
+
+
+def _load_gui_modules() -> None:
+    """导入图形界面所需的模块"""
+    global tk, ttk, messagebox, simpledialog, filedialog
+    import tkinter as tk
+    from tkinter import ttk, messagebox, simpledialog, filedialog
+
+# desktop.ini需使用系统默认代码页编码
+INI_ENCODING = 'ANSI' if os.name == 'nt' else 'utf-8'
+# 转换后的ico缓存目录
+ICON_CACHE_DIR = os.path.join('图标', '.cache')
+# 创建目录时的默认并发线程数 (主要受文件系统延迟限制)
+DEFAULT_JOBS = 8
+# 生成ico时包含的尺寸 (资源管理器各视图实际使用的尺寸)
+ICO_SIZES = ((16, 16), (32, 32), (48, 48), (256, 256))
+# 图标选择对话框的缩略图缓存目录与尺寸
+THUMBNAIL_CACHE_DIR = os.path.join(ICON_CACHE_DIR, 'thumbs')
+THUMBNAIL_SIZE = 32
+# 会话内保留的缩略图数量
+THUMBNAIL_LRU_SIZE = 512
+# 导入目录时每个任务扫描的最大目录数
+IMPORT_BATCH_SIZE = 256
+# 编辑后自动保存的合并等待时间(毫秒)
+AUTO_SAVE_DELAY_MS = 500
+# 目录完整路径的最大长度: MAX_PATH(260) 减去结尾的 "\desktop.ini" 与终止符
+MAX_FOLDER_PATH = 247
+
+
+def write_json_atomic(path: str, data: Any, **dump_kwargs) -> None:
+    """先写入临时文件再替换原文件, 写入中途崩溃不会损坏原文件"""
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, **dump_kwargs)
+    os.replace(temp_path, path)
+
+
+class BackgroundJsonWriter:
+    """在后台线程中串行写入JSON文件, 同一文件尚未写入的多次提交只写入最新内容"""
+    
+    def __init__(self, **dump_kwargs):
+        self._dump_kwargs = dump_kwargs
+        # 路径 -> 待写入的数据
+        self._pending: Dict[str, Any] = {}
+        self._writing = False
+        self._closed = False
+        self._cond = threading.Condition()
+        # 写入失败的 (路径, 异常), 由界面线程读取并提示
+        self.errors: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+    
+    @property
+    def busy(self) -> bool:
+        with self._cond:
+            return bool(self._pending) or self._writing
+    
+    def submit(self, path: str, data: Any) -> None:
+        with self._cond:
+            self._pending[path] = data
+            self._cond.notify_all()
+    
+    def wait(self) -> None:
+        """等待所有已提交的内容写入完成"""
+        with self._cond:
+            while self._pending or self._writing:
+                self._cond.wait()
+    
+    def close(self) -> None:
+        """写完剩余内容后结束后台线程"""
+        self.wait()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+    
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                path = next(iter(self._pending))
+                data = self._pending.pop(path)
+                self._writing = True
+            try:
+                write_json_atomic(path, data, **self._dump_kwargs)
+            except Exception as e:
+                self.errors.put((path, e))
+            finally:
+                with self._cond:
+                    self._writing = False
+                    self._cond.notify_all()
+
+
+# 没有子目录或元数据的节点共用的只读空映射, 首次写入时才分配字典
+_NO_ITEMS = MappingProxyType({})
+
+
+class FolderNode:
+    """目录结构模型中的节点"""
+    
+    __slots__ = ('name', 'parent', 'children', 'meta')
+    
+    def __init__(self, name: str, parent: Optional['FolderNode'] = None):
+        self.name = sys.intern(name)
+        self.parent = parent
+        # 子目录名 -> 节点, 保持配置中的顺序
+        self.children: Dict[str, 'FolderNode'] = _NO_ITEMS
+        # 以下划线开头的元数据, 如 _icon
+        self.meta: Dict[str, Any] = _NO_ITEMS
+    
+    def attach(self, child: 'FolderNode') -> None:
+        """将子节点加入children"""
+        if self.children is _NO_ITEMS:
+            self.children = {}
+        self.children[child.name] = child
+    
+    def set_meta(self, key: str, value: Any) -> None:
+        """设置元数据, value为None时删除该项"""
+        if value is None:
+            if key in self.meta:
+                del self.meta[key]
+            return
+        if self.meta is _NO_ITEMS:
+            self.meta = {}
+        self.meta[key] = sys.intern(value) if isinstance(value, str) else value
+    
+    @property
+    def icon(self) -> Optional[str]:
+        return self.meta.get('_icon')
+    
+    def path(self) -> List[str]:
+        """从顶层目录到当前节点的目录名列表 (不含根节点)"""
+        names = []
+        node = self
+        while node.parent is not None:
+            names.append(node.name)
+            node = node.parent
+        names.reverse()
+        return names
+    
+    @classmethod
+    def from_dict(cls, name: str, content: Dict, parent: Optional['FolderNode'] = None) -> 'FolderNode':
+        """由配置字典构建节点树"""
+        root = cls(name, parent)
+        stack = [(root, content)]
+        while stack:
+            node, content = stack.pop()
+            if not isinstance(content, dict):
+                continue
+            for key, value in content.items():
+                if key.startswith('_'):
+                    node.set_meta(key, value)
+                else:
+                    child = cls(key, node)
+                    node.attach(child)
+                    stack.append((child, value))
+        return root
+    
+    def to_dict(self) -> Dict:
+        """序列化为配置字典"""
+        result = dict(self.meta)
+        stack = [(self, result)]
+        while stack:
+            node, out = stack.pop()
+            for name, child in node.children.items():
+                child_out = dict(child.meta)
+                out[name] = child_out
+                stack.append((child, child_out))
+        return result
+
+
+class FolderModel:
+    """可编辑的目录结构模型, 修改后通过事件通知订阅者
+    
+    事件回调形式为 callback(event, node), event为 'add' / 'remove' / 'icon'
+    """
+    
+    ROOT_NAME = '根目录'
+    
+    def __init__(self, folders: Optional[Dict] = None):
+        self.root = FolderNode.from_dict(self.ROOT_NAME, folders or {})
+        self._listeners: List[Callable[[str, FolderNode], None]] = []
+    
+    @classmethod
+    def from_config(cls, data: Dict) -> 'FolderModel':
+        return cls(data.get('folders', {}))
+    
+    def to_config(self) -> Dict:
+        return {'folders': self.root.to_dict()}
+    
+    def subscribe(self, callback: Callable[[str, FolderNode], None]) -> None:
+        self._listeners.append(callback)
+    
+    def _notify(self, event: str, node: FolderNode) -> None:
+        for callback in self._listeners:
+            callback(event, node)
+    
+    def add_child(self, parent: FolderNode, name: str) -> FolderNode:
+        """添加子目录, 同名目录已存在时抛出ValueError"""
+        if name in parent.children:
+            raise ValueError(f"目录 {name} 已存在")
+        if not name or name.startswith('_'):
+            raise ValueError(f"无效的目录名 {name}")
+        node = FolderNode(name, parent)
+        parent.attach(node)
+        self._notify('add', node)
+        return node
+    
+    def remove(self, node: FolderNode) -> None:
+        """删除目录及其所有子目录"""
+        if node.parent is None:
+            raise ValueError("不能删除根目录")
+        del node.parent.children[node.name]
+        self._notify('remove', node)
+    
+    def set_icon(self, node: FolderNode, icon_path: Optional[str]) -> None:
+        """设置或移除(icon_path为None)目录图标"""
+        node.set_meta('_icon', icon_path)
+        self._notify('icon', node)
+
+
+class FolderIndex:
+    """目录名、完整路径与图标的搜索索引, 通过模型事件随添加/删除/设置图标更新
+    
+    名称(或路径)以换行连接成一个小写字符串, 搜索时用str.find在其中查找;
+    新增节点追加到末尾, 删除的节点在搜索时跳过, 累积过多时才重新拼接
+    """
+    
+    ICON_PREFIX = 'icon:'
+    
+    def __init__(self, model: FolderModel):
+        # 已索引的节点 (不含根节点), 顺序与拼接文本一致
+        self._nodes: List[FolderNode] = []
+        # 已删除但仍在拼接文本中的节点
+        self._removed = set()
+        # 图标路径 -> 使用该图标的节点
+        self._by_icon: Dict[str, set] = {}
+        # 惰性构建的 [拼接文本, 各项起始位置]
+        self._names: Optional[List] = None
+        self._paths: Optional[List] = None
+        
+        stack = list(model.root.children.values())
+        while stack:
+            node = stack.pop()
+            self._add(node)
+            stack.extend(node.children.values())
+        model.subscribe(self._on_change)
+    
+    def _add(self, node: FolderNode) -> None:
+        self._nodes.append(node)
+        if node.icon:
+            self._by_icon.setdefault(node.icon, set()).add(node)
+        if self._names is not None:
+            self._append(self._names, node.name.lower())
+        if self._paths is not None:
+            self._append(self._paths, '/'.join(node.path()).lower())
+    
+    @staticmethod
+    def _append(joined: List, key: str) -> None:
+        joined[1].append(len(joined[0]) + 1)
+        joined[0] += '\n' + key
+    
+    def _on_change(self, event: str, node: FolderNode) -> None:
+        if event == 'add':
+            self._add(node)
+        elif event == 'remove':
+            # 删除的子树仍保持完整, 一并移除其中的节点
+            stack = [node]
+            while stack:
+                current = stack.pop()
+                self._removed.add(current)
+                if current.icon:
+                    self._by_icon.get(current.icon, set()).discard(current)
+                stack.extend(current.children.values())
+            if len(self._removed) * 2 > len(self._nodes):
+                self._nodes = [node for node in self._nodes if node not in self._removed]
+                self._removed.clear()
+                self._names = self._paths = None
+        elif event == 'icon':
+            for nodes in self._by_icon.values():
+                nodes.discard(node)
+            if node.icon:
+                self._by_icon.setdefault(node.icon, set()).add(node)
+    
+    @staticmethod
+    def _join(keys: List[str]) -> List:
+        """拼接为 "\nkey1\nkey2..." 并记录每个key的起始位置"""
+        offsets = []
+        position = 1
+        for key in keys:
+            offsets.append(position)
+            position += len(key) + 1
+        return ['\n' + '\n'.join(keys), offsets]
+    
+    def _text(self, paths: bool) -> List:
+        if not paths:
+            if self._names is None:
+                self._names = self._join([node.name.lower() for node in self._nodes])
+            return self._names
+        if self._paths is None:
+            # 按节点缓存路径, 每个父节点的路径只计算一次
+            cache: Dict[FolderNode, str] = {}
+            keys = []
+            for node in self._nodes:
+                chain = []
+                current = node
+                while current.parent is not None and current not in cache:
+                    chain.append(current)
+                    current = current.parent
+                prefix = cache.get(current, '')
+                for current in reversed(chain):
+                    prefix = cache[current] = (prefix + '/' if prefix else '') + current.name.lower()
+                keys.append(cache[node])
+            self._paths = self._join(keys)
+        return self._paths
+    
+    def search(self, query: str, limit: int = 100) -> List[FolderNode]:
+        """搜索目录, 不区分大小写, 以名称开头的匹配排在前面
+        
+        查询含 "/" 时匹配完整路径 (不含根节点), 以 "icon:" 开头时匹配图标路径
+        """
+        query = query.strip().lower()
+        if not query:
+            return []
+        if query.startswith(self.ICON_PREFIX):
+            pattern = query[len(self.ICON_PREFIX):].strip()
+            matches = []
+            for icon, nodes in self._by_icon.items():
+                if pattern in icon.lower():
+                    matches.extend(nodes)
+            matches.sort(key=FolderNode.path)
+            return matches[:limit]
+        
+        text, offsets = self._text(paths='/' in query)
+        query = query.replace('\n', '')
+        found = []
+        seen = set()
+        # 先查找以查询开头的项, 再查找其余包含查询的项
+        for pattern, shift in (('\n' + query, 1), (query, 0)):
+            position = text.find(pattern)
+            while position != -1 and len(found) < limit:
+                index = bisect.bisect_right(offsets, position + shift) - 1
+                if index not in seen:
+                    seen.add(index)
+                    node = self._nodes[index]
+                    if node not in self._removed:
+                        found.append(node)
+                position = text.find(pattern, position + 1)
+        return found
+
+
+class CompactNode:
+    """NodeStore中不可变的节点, 内容相同的子树只保存一份
+    
+    meta与children在多个位置间共享, 只能读取不能修改
+    """
+    
+    __slots__ = ('meta', 'children')
+    
+    def __init__(self, meta: Dict[str, Any], children: Tuple[Tuple[str, 'CompactNode'], ...]):
+        self.meta = meta
+        # ((子目录名, 子节点), ...), 保持配置中的顺序
+        self.children = children
+
+
+class NodeStore:
+    """只读的紧凑目录结构, 用于生成计划和批量应用
+    
+    目录名与图标路径被驻留, 内容相同的子树(名称、元数据与子目录均相同)合并为同一个节点,
+    可由配置字典构建或在解析JSON时直接构建, 并可序列化回原有的配置格式
+    """
+    
+    def __init__(self):
+        # (元数据键, 子目录元组) -> 节点
+        self._table: Dict[Tuple, CompactNode] = {}
+        self._empty = self._node((), ())
+        self.root = self._empty
+    
+    @staticmethod
+    def _freeze(value: Any) -> Any:
+        """将元数据值转换为可哈希的键
+        
+        非字符串的值带上类型, 避免 1、1.0 与 true 或字符串与JSON文本被当作相同的值合并
+        """
+        if type(value) is str or value is None:
+            return value
+        if isinstance(value, (int, float)):
+            return (type(value).__name__, repr(value))
+        return ('json', json.dumps(value, sort_keys=True, ensure_ascii=False))
+    
+    def _node(self, meta_items: Tuple[Tuple[str, Any], ...],
+              children: Tuple[Tuple[str, CompactNode], ...]) -> CompactNode:
+        """返回内容相同的已有节点, 不存在时创建"""
+        # 子节点已经合并过, 按对象身份比较即可
+        key = (tuple([(k, self._freeze(v)) for k, v in meta_items]) if meta_items else (), children)
+        node = self._table.get(key)
+        if node is None:
+            node = CompactNode(dict(meta_items) if meta_items else _NO_ITEMS, children)
+            self._table[key] = node
+        return node
+    
+    def _make(self, pairs: List[Tuple[str, Any]], loading: bool = False) -> Union[CompactNode, Dict]:
+        """由一个配置对象的键值对生成节点, 对象形式的子目录值必须已经是节点或字典
+        
+        loading为True时 (解析JSON), 重复的键与json.load一致只保留最后一个值,
+        含有字符串等非对象子目录值的对象保留为字典
+        """
+        if loading and len(pairs) > 1:
+            unique = dict(pairs)
+            if len(unique) != len(pairs):
+                pairs = list(unique.items())
+        meta_items = []
+        children = []
+        intern = sys.intern
+        for key, value in pairs:
+            if key[:1] == '_':
+                if isinstance(value, (CompactNode, list)):
+                    value = self._thaw(value)
+                meta_items.append((key, intern(value) if isinstance(value, str) else value))
+            else:
+                if type(value) is not CompactNode:
+                    if loading:
+                        return {key: self._thaw(value) for key, value in pairs}
+                    value = self._node_of(value)
+                children.append((intern(key), value))
+        return self._node(tuple(meta_items), tuple(children))
+    
+    def _node_of(self, value: Any) -> CompactNode:
+        """返回子目录值对应的节点, 与FolderNode一致, 非对象的值视为空目录"""
+        if type(value) is CompactNode:
+            return value
+        if isinstance(value, dict):
+            return self._build(value)
+        return self._empty
+    
+    def _thaw(self, value: Any) -> Any:
+        """将解析时已合并为节点的元数据值还原为普通的字典与列表"""
+        if isinstance(value, CompactNode):
+            return self._to_dict(value, {})
+        if isinstance(value, list):
+            return [self._thaw(item) for item in value]
+        if isinstance(value, dict):
+            return {key: self._thaw(item) for key, item in value.items()}
+        return value
+    
+    def _load_object(self, pairs: List[Tuple[str, Any]]) -> Union[CompactNode, Dict]:
+        """解析JSON时的object_pairs_hook
+        
+        子目录值都是对象的JSON对象立即合并为节点; 含有字符串等其他值的对象多为元数据,
+        保留为字典以免丢失内容, 作为子目录使用时再构建节点
+        """
+        return self._make(pairs, True)
+    
+    def _build(self, folders: Dict) -> CompactNode:
+        """由folders字典构建节点"""
+        # 后序遍历, 子节点先于父节点构建; 每层的结果暂存在该层的列表中
+        stack = [(iter(folders.items()), [])]
+        while True:
+            items, pairs = stack[-1]
+            for key, value in items:
+                if key[:1] != '_' and isinstance(value, dict):
+                    stack.append((iter(value.items()), []))
+                    pairs.append((key, None))
+                    break
+                pairs.append((key, value))
+            else:
+                node = self._make(pairs)
+                stack.pop()
+                if not stack:
+                    return node
+                parent_pairs = stack[-1][1]
+                parent_pairs[-1] = (parent_pairs[-1][0], node)
+    
+    @classmethod
+    def from_dict(cls, folders: Dict) -> 'NodeStore':
+        """由配置中的folders字典构建"""
+        store = cls()
+        store.root = store._build(folders)
+        return store
+    
+    @classmethod
+    def load(cls, path: str) -> 'NodeStore':
+        """解析配置文件, 每个JSON对象解析完成后立即合并, 不生成完整的字典树"""
+        store = cls()
+        with open(path, 'r', encoding='utf-8') as f:
+            top = json.load(f, object_pairs_hook=store._load_object)
+        if isinstance(top, CompactNode):
+            folders = dict(top.children).get('folders')
+        else:
+            folders = top.get('folders') if isinstance(top, dict) else None
+        if folders is not None:
+            store.root = store._node_of(folders)
+        return store
+    
+    @property
+    def unique_nodes(self) -> int:
+        """合并后实际保存的节点数"""
+        return len(self._table)
+    
+    def count(self) -> int:
+        """展开模板后的目录总数"""
+        counts: Dict[int, int] = {}
+        stack = [(self.root, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if id(node) in counts:
+                continue
+            if not expanded:
+                stack.append((node, True))
+                stack.extend((child, False) for _, child in node.children if id(child) not in counts)
+                continue
+            counts[id(node)] = sum(template_size(name) * (1 + counts[id(child)])
+                                   for name, child in node.children)
+        return counts[id(self.root)]
+    
+    def _to_dict(self, node: CompactNode, memo: Dict[int, Dict]) -> Dict:
+        result = memo.get(id(node))
+        if result is None:
+            result = dict(node.meta)
+            for name, child in node.children:
+                result[name] = self._to_dict(child, memo)
+            memo[id(node)] = result
+        return result
+    
+    def to_dict(self) -> Dict:
+        """序列化为配置中的folders字典, 相同子树共享同一个字典对象"""
+        memo: Dict[int, Dict] = {}
+        # 先由叶子向上构建, 避免深层目录树的递归
+        stack = [(self.root, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if id(node) in memo:
+                continue
+            if not expanded:
+                stack.append((node, True))
+                stack.extend((child, False) for _, child in node.children)
+                continue
+            self._to_dict(node, memo)
+        return memo[id(self.root)]
+    
+    @staticmethod
+    def _iter_children(node: CompactNode) -> Iterator[Tuple[str, CompactNode]]:
+        for name, child in node.children:
+            for folder_name in expand_folder_name(name):
+                yield folder_name, child
+    
+    def iter_nodes(self, base_path: str) -> Iterator[Tuple[str, Dict]]:
+        """与iter_folder_nodes相同的遍历顺序, 产出 (目录绝对路径, 节点元数据)"""
+        stack = [(os.path.abspath(base_path), self._iter_children(self.root))]
+        while stack:
+            parent_path, items = stack[-1]
+            for folder_name, child in items:
+                folder_path = os.path.join(parent_path, folder_name)
+                yield folder_path, child.meta
+                stack.append((folder_path, self._iter_children(child)))
+                break
+            else:
+                stack.pop()
+
+def summarize_config(folders: Dict) -> Dict[str, int]:
+    """统计配置的目录数、设置图标的目录数与最大层数, 模板目录按展开后计算"""
+    nodes = icons = depth = 0
+    # (节点内容, 层数, 该内容实际出现的次数)
+    stack = [(folders, 0, 1)]
+    while stack:
+        content, level, repeat = stack.pop()
+        for name, child in content.items():
+            if name.startswith('_'):
+                continue
+            count = repeat * template_size(name)
+            nodes += count
+            depth = max(depth, level + 1)
+            if isinstance(child, dict):
+                if child.get('_icon'):
+                    icons += count
+                stack.append((child, level + 1, count))
+    return {'nodes': nodes, 'icons': icons, 'depth': depth}
+
+
+class ConfigCatalog:
+    """配置文件列表及其统计信息的缓存, 按修改时间与大小判断是否需要重新统计"""
+    
+    FILENAME = '.filestree-catalog.json'
+    
+    def __init__(self, directory: str = '.'):
+        self.directory = directory
+        self.path = os.path.join(directory, self.FILENAME)
+        # 文件名 -> {'mtime_ns', 'size', 'nodes', 'icons', 'depth'} 或解析失败时的 {'error'}
+        self.entries: Dict[str, Dict] = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f).get('files', {})
+        except (OSError, ValueError, AttributeError):
+            pass
+    
+    def scan(self) -> Tuple[List[str], List[str]]:
+        """列出配置文件, 返回 (文件名列表, 需要重新统计的文件名列表), 只读取文件属性"""
+        names = []
+        stale = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                # 跳过清单等隐藏文件
+                if not entry.name.endswith('.json') or entry.name.startswith('.'):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                names.append(entry.name)
+                cached = self.entries.get(entry.name)
+                if (cached is None or cached.get('mtime_ns') != st.st_mtime_ns
+                        or cached.get('size') != st.st_size):
+                    self.entries[entry.name] = {'mtime_ns': st.st_mtime_ns, 'size': st.st_size}
+                    stale.append(entry.name)
+                elif 'nodes' not in cached and 'error' not in cached:
+                    stale.append(entry.name)
+        names.sort()
+        for name in set(self.entries).difference(names):
+            del self.entries[name]
+        return names, stale
+    
+    def summarize(self, name: str) -> Dict:
+        """解析并统计单个配置文件, 可在后台线程中调用"""
+        try:
+            with open(os.path.join(self.directory, name), 'r', encoding='utf-8') as f:
+                return summarize_config(json.load(f).get('folders', {}))
+        except (OSError, ValueError, AttributeError) as e:
+            return {'error': str(e)}
+    
+    def update(self, name: str, summary: Dict) -> None:
+        """写入统计结果, 文件已从列表中移除时忽略"""
+        if name in self.entries:
+            self.entries[name].update(summary)
+    
+    def save(self) -> None:
+        try:
+            write_json_atomic(self.path, {'version': 1, 'files': self.entries}, separators=(',', ':'))
+        except OSError as e:
+            logger.warning("无法保存配置列表缓存 %s: %s", self.path, e)
+
 
 class ConfigEditorGUI:
     def __init__(self, root):
@@ -23,11 +681,29 @@ class ConfigEditorGUI:
         
         # 当前编辑的配置文件名
         self.current_file: Optional[str] = None
-        # 存储目录结构的字典
-        self.folder_structure: Dict = {}
+        # 目录结构模型
+        self.model: Optional[FolderModel] = None
         
         # 添加图标缓存字典
         self.icon_cache = {}
+        # 图标选择对话框的缩略图: (路径, 修改时间) -> PhotoImage, 按最近使用淘汰
+        self._thumbnails: OrderedDict = OrderedDict()
+        self._thumbnail_loader = ThumbnailLoader()
+        # 自动保存: 合并短时间内的多次修改, 在后台线程中写入
+        self._saver = BackgroundJsonWriter(indent=4)
+        self._save_dirty = False
+        self._save_job: Optional[str] = None
+        # 树节点id <-> 模型节点
+        self._item_nodes: Dict[str, FolderNode] = {}
+        self._node_items: Dict[FolderNode, str] = {}
+        # 子节点尚未插入(仅有占位节点)的树节点
+        self._unpopulated = set()
+        # 当前模型的搜索索引, 首次搜索时构建
+        self._index: Optional[FolderIndex] = None
+        self._search_matches: List[FolderNode] = []
+        # 配置文件列表及其统计信息缓存, _config_files与列表框中的行一一对应
+        self._catalog = ConfigCatalog()
+        self._config_files: List[str] = []
         
         self._init_ui()
         self._load_configs()
@@ -58,7 +734,9 @@ class ConfigEditorGUI:
         
         ttk.Button(toolbar, text="新建配置", command=self._new_config).pack(side=tk.LEFT, padx=5)
         ttk.Button(toolbar, text="删除配置", command=self._delete_config).pack(side=tk.LEFT, padx=5)
-        ttk.Button(toolbar, text="创建目录", command=self._create_folders).pack(side=tk.LEFT, padx=5)
+        ttk.Button(toolbar, text="导入目录", command=self._import_config).pack(side=tk.LEFT, padx=5)
+        self.create_button = ttk.Button(toolbar, text="创建目录", command=self._create_folders)
+        self.create_button.pack(side=tk.LEFT, padx=5)
     
     def _create_config_list(self):
         """创建左侧配置文件列表"""
@@ -73,7 +751,7 @@ class ConfigEditorGUI:
     def _set_folder_icon(self):
         """设置文件夹图标"""
         selected = self.tree.selection()
-        if not selected or self.tree.item(selected[0])['text'] == '根目录':
+        if not selected or self._item_nodes[selected[0]].parent is None:
             return
         
         # 创建图标选择对话框
@@ -155,44 +833,78 @@ class ConfigEditorGUI:
         ).pack(pady=2)
         ttk.Label(no_icon_frame, text="默认").pack()
         
-        # 加载实际图标
+        # 先创建所有图标按钮, 缩略图在后台解码后逐个填充
+        results = queue.Queue()
+        futures = []
         icon_count = 1  # 从1开始计数，因为0被"无图标"占用
         for file in os.listdir('图标'):
-            if file.lower().endswith(('.ico', '.png')):
-                try:
-                    icon_path = os.path.join('图标', file)
-                    if file.lower().endswith('.png'):
-                        # 动态调整图标大小以适配预览
-                        max_size = 24
-                        preview_size = 32
-                        original_icon = Image.open(icon_path)
-                        # original_icon.thumbnail((max_size, max_size), Image.LANCZOS)
-                        original_icon = original_icon.resize((preview_size, preview_size), Image.LANCZOS)
-                        preview_icon = ImageTk.PhotoImage(original_icon)
-                        
-                        # 创建图标按钮框架
-                        btn_frame = ttk.Frame(grid_frame)
-                        row = icon_count // 4  # 每行4个图标
-                        col = icon_count % 4
-                        btn_frame.grid(row=row, column=col, padx=10, pady=10, sticky='nsew')
-                        
-                        # 创建图标按钮
-                        btn = ttk.Button(
-                            btn_frame,
-                            image=preview_icon,
-                            command=lambda p=icon_path: on_icon_click(p)
-                        )
-                        btn.image = preview_icon  # 保持引用
-                        btn.pack(pady=2)
-                        
-                        # 显示文件名（限制长度）
-                        name = file if len(file) <= 15 else file[:12] + '...'
-                        ttk.Label(btn_frame, text=name).pack()
-                        
-                        icon_count += 1
-                        
-                except Exception as e:
-                    print(f"无法加载图标 {file}: {str(e)}")
+            if not file.lower().endswith(('.ico', '.png')):
+                continue
+            icon_path = os.path.join('图标', file)
+            try:
+                mtime_ns = os.stat(icon_path).st_mtime_ns
+            except OSError as e:
+                logger.warning("无法加载图标 %s: %s", file, e)
+                continue
+            
+            # 创建图标按钮框架
+            btn_frame = ttk.Frame(grid_frame)
+            row = icon_count // 4  # 每行4个图标
+            col = icon_count % 4
+            btn_frame.grid(row=row, column=col, padx=10, pady=10, sticky='nsew')
+            
+            # 创建图标按钮
+            btn = ttk.Button(
+                btn_frame,
+                text="...",
+                width=4,
+                command=lambda p=icon_path: on_icon_click(p)
+            )
+            btn.pack(pady=2)
+            
+            # 显示文件名（限制长度）
+            name = file if len(file) <= 15 else file[:12] + '...'
+            ttk.Label(btn_frame, text=name).pack()
+            
+            key = (icon_path, mtime_ns)
+            if key in self._thumbnails:
+                self._thumbnails.move_to_end(key)
+                self._set_thumbnail(btn, self._thumbnails[key])
+            else:
+                future = self._thumbnail_loader.submit(icon_path, mtime_ns)
+                future.add_done_callback(lambda f, b=btn, k=key: results.put((b, k, f)))
+                futures.append(future)
+            
+            icon_count += 1
+        
+        def poll_thumbnails():
+            if not icon_dialog.winfo_exists():
+                # 对话框已关闭, 放弃尚未开始的解码
+                for future in futures:
+                    future.cancel()
+                return
+            try:
+                while True:
+                    btn, key, future = results.get_nowait()
+                    futures.remove(future)
+                    if future.cancelled():
+                        continue
+                    try:
+                        from PIL import ImageTk
+                        preview_icon = ImageTk.PhotoImage(future.result())
+                    except Exception as e:
+                        logger.warning("无法加载图标 %s: %s", key[0], e)
+                        btn.configure(text="?")
+                        continue
+                    self._remember_thumbnail(key, preview_icon)
+                    self._set_thumbnail(btn, preview_icon)
+            except queue.Empty:
+                pass
+            if futures:
+                icon_dialog.after(30, poll_thumbnails)
+        
+        if futures:
+            icon_dialog.after(30, poll_thumbnails)
         
         # 配置网格列的权重
         for i in range(4):
@@ -211,67 +923,67 @@ class ConfigEditorGUI:
         # 绑定ESC键关闭窗口
         icon_dialog.bind('<Escape>', lambda e: icon_dialog.destroy())
     
+    @staticmethod
+    def _set_thumbnail(btn, preview_icon):
+        """在图标按钮上显示缩略图"""
+        btn.configure(image=preview_icon, text='', width=0)
+        btn.image = preview_icon  # 保持引用
+    
+    def _remember_thumbnail(self, key, preview_icon):
+        """加入会话内缩略图缓存, 超出容量时淘汰最久未使用的"""
+        self._thumbnails[key] = preview_icon
+        self._thumbnails.move_to_end(key)
+        while len(self._thumbnails) > THUMBNAIL_LRU_SIZE:
+            self._thumbnails.popitem(last=False)
+    
     def _apply_icon(self, item_id: str, icon_path: str):
         """应用选择的图标到文件夹"""
         try:
-            if icon_path is None:
-                # 移除图标
-                self.tree.item(item_id, image='')
-                # 更新配置
-                path = self._get_item_path(item_id)
-                current = self.folder_structure.get('folders', {})
-                for p in path[1:]:
-                    if p not in current:
-                        current[p] = {}
-                    current = current[p]
-                    if not isinstance(current, dict):
-                        current = {}
-                
-                # 移除图标配置
-                if isinstance(current, dict) and '_icon' in current:
-                    del current['_icon']
-            else:
-                # 原有的图标设置逻辑
+            rel_path = None
+            if icon_path is not None:
                 rel_path = os.path.relpath(icon_path)
-                if rel_path not in self.icon_cache:
-                    original_icon = Image.open(icon_path)
-                    # 动态调整图标大小以适配树状图
-                    max_size = 16
-                    original_icon.thumbnail((max_size, max_size), Image.LANCZOS)
-                    self.icon_cache[rel_path] = ImageTk.PhotoImage(original_icon)
-                self.tree.item(item_id, image=self.icon_cache[rel_path])
-                
-                path = self._get_item_path(item_id)
-                current = self.folder_structure.get('folders', {})
-                for p in path[1:]:
-                    if p not in current:
-                        current[p] = {}
-                    current = current[p]
-                    if not isinstance(current, dict):
-                        current = {}
-                
-                current['_icon'] = rel_path
+                if self._get_tree_icon(rel_path) is None:
+                    raise ValueError(f"无法加载图标 {rel_path}")
+            self.model.set_icon(self._item_nodes[item_id], rel_path)
             
             # 保存配置
             self._auto_save()
             
         except Exception as e:
             messagebox.showerror("错误", f"设置图标失败: {str(e)}")
-            print(f"错误详情: {str(e)}")
+            logger.exception("设置图标失败")
     
-    def _get_item_path(self, item_id: str) -> list:
-        """获取树节点的完整路径"""
-        path = []
-        while item_id:
-            path.insert(0, self.tree.item(item_id)['text'])
-            item_id = self.tree.parent(item_id)
-        return path
+    def _get_tree_icon(self, icon_path: str):
+        """获取树状图中使用的图标, 加载失败时返回None"""
+        if icon_path not in self.icon_cache:
+            try:
+                from PIL import Image, ImageTk
+                original_icon = Image.open(icon_path)
+                # 动态调整图标大小以适配树状图
+                max_size = 16
+                original_icon.thumbnail((max_size, max_size), Image.LANCZOS)
+                self.icon_cache[icon_path] = ImageTk.PhotoImage(original_icon)
+            except Exception as e:
+                logger.warning("无法加载图标 %s: %s", icon_path, e)
+                return None
+        return self.icon_cache[icon_path]
     
     def _create_tree_editor(self):
         """创建右侧录树编辑器"""
         editor_frame = ttk.LabelFrame(self.paned, text="目录结构", padding="5")
         self.paned.add(editor_frame, weight=3)
         
+        # 搜索框: 按目录名、完整路径(含"/")或图标("icon:图标名")查找
+        search_frame = ttk.Frame(editor_frame)
+        search_frame.pack(fill=tk.X, pady=(0, 5))
+        ttk.Label(search_frame, text="搜索:").pack(side=tk.LEFT)
+        self.search_var = tk.StringVar()
+        self.search_var.trace_add('write', lambda *args: self._on_search())
+        ttk.Entry(search_frame, textvariable=self.search_var).pack(side=tk.LEFT, fill=tk.X, expand=True)
+        # 搜索结果, 有结果时才显示
+        self.search_results = tk.Listbox(editor_frame, height=6)
+        self.search_results.bind('<<ListboxSelect>>', self._on_search_select)
+        
         self.tree = ttk.Treeview(editor_frame, selectmode='browse')
         self.tree.pack(fill=tk.BOTH, expand=True)
         
@@ -282,68 +994,207 @@ class ConfigEditorGUI:
         self.context_menu.add_command(label="删除", command=self._delete_folder)
         
         self.tree.bind("<Button-3>", self._show_context_menu)
+        # 展开节点时才插入其子节点
+        self.tree.bind("<<TreeviewOpen>>", self._on_tree_open)
     
     def _load_configs(self):
-        """加载所有配置文件"""
+        """加载所有配置文件, 统计信息取自缓存, 修改过的文件在后台重新统计"""
+        names, stale = self._catalog.scan()
+        self._config_files = names
         self.config_listbox.delete(0, tk.END)
-        for file in os.listdir('.'):
-            if file.endswith('.json'):
-                self.config_listbox.insert(tk.END, file)
+        for name in names:
+            self.config_listbox.insert(tk.END, self._config_label(name))
+        if stale:
+            self._refresh_catalog(stale)
+    
+    def _config_label(self, name: str) -> str:
+        """配置文件列表中显示的文本"""
+        entry = self._catalog.entries.get(name, {})
+        if 'error' in entry:
+            return f"{name}  (无法解析)"
+        if 'nodes' not in entry:
+            return f"{name}  (统计中...)"
+        return f"{name}  ({entry['nodes']}个目录, {entry['icons']}个图标, {entry['depth']}层)"
+    
+    def _refresh_catalog(self, names: List[str]):
+        """在后台线程中重新统计配置文件, 逐个更新列表中的对应行"""
+        results = queue.Queue()
+        
+        def worker():
+            for name in names:
+                results.put((name, self._catalog.summarize(name)))
+            results.put(None)
+        
+        def poll():
+            while True:
+                try:
+                    item = results.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._catalog.save()
+                    return
+                name, summary = item
+                self._catalog.update(name, summary)
+                if name in self._config_files:
+                    index = self._config_files.index(name)
+                    selected = self.config_listbox.selection_includes(index)
+                    self.config_listbox.delete(index)
+                    self.config_listbox.insert(index, self._config_label(name))
+                    if selected:
+                        self.config_listbox.selection_set(index)
+            self.root.after(100, poll)
+        
+        threading.Thread(target=worker, daemon=True).start()
+        self.root.after(100, poll)
     
     def _on_config_select(self, event):
         """当选择配置文件时触发"""
         selection = self.config_listbox.curselection()
         if selection:
-            filename = self.config_listbox.get(selection[0])
+            filename = self._config_files[selection[0]]
             self._load_config_file(filename)
     
     def _load_config_file(self, filename: str):
         """加载指定配置文件"""
+        # 切换前保存当前配置的修改
+        self._save_now()
         try:
             with open(filename, 'r', encoding='utf-8') as f:
-                self.folder_structure = json.load(f)
+                self._set_model(FolderModel.from_config(json.load(f)))
                 self.current_file = filename
                 self._update_tree()
         except Exception as e:
             messagebox.showerror("错误", f"无法加载配置文件: {str(e)}")
     
+    def _set_model(self, model: Optional[FolderModel]):
+        """切换当前编辑的模型并订阅其修改事件"""
+        self.model = model
+        self._index = None
+        if model is not None:
+            model.subscribe(self._on_model_change)
+        self.search_var.set('')
+    
+    def _clear_tree(self):
+        """清空树形视图及节点映射"""
+        self.tree.delete(*self.tree.get_children())
+        self._item_nodes.clear()
+        self._node_items.clear()
+        self._unpopulated.clear()
+    
     def _update_tree(self):
         """更新目录树显示"""
-        self.tree.delete(*self.tree.get_children())
-        folders = self.folder_structure.get('folders', {})
-        # 添加根节点
-        root = self.tree.insert('', 'end', text='根目录')
-        self._build_tree(root, folders)
-    
-    def _build_tree(self, parent: str, folders: Dict):
-        """递归构建目录树"""
-        for folder, content in folders.items():
-            # 检查是否有图标设置
-            icon = None
-            if isinstance(content, dict) and '_icon' in content:
-                icon_path = content['_icon']
-                try:
-                    if icon_path not in self.icon_cache:
-                        original_icon = Image.open(icon_path)
-                        # 动态调整图标大小以适配树状图
-                        max_size = 16
-                        original_icon.thumbnail((max_size, max_size), Image.LANCZOS)
-                        self.icon_cache[icon_path] = ImageTk.PhotoImage(original_icon)
-                    icon = self.icon_cache[icon_path]
-                except Exception as e:
-                    print(f"无法加载图标 {icon_path}: {str(e)}")
-            
-            # 根据是否有图标来决定传递的参数
-            if icon:
-                folder_id = self.tree.insert(parent, 'end', text=folder, image=icon)
+        self._clear_tree()
+        # 添加根节点, 子节点在展开时再插入
+        self._insert_node('', self.model.root)
+    
+    def _insert_node(self, parent: str, node: FolderNode) -> str:
+        """插入模型节点对应的行, 有子目录时添加占位子节点"""
+        # 检查是否有图标设置, 仅为实际插入的节点加载图标
+        icon = self._get_tree_icon(node.icon) if node.icon else None
+        
+        # 模板目录只显示一行, 并标出展开后的目录数
+        count = template_size(node.name)
+        text = f"{node.name}  (×{count})" if count > 1 else node.name
+        
+        # 根据是否有图标来决定传递的参数
+        if icon:
+            item = self.tree.insert(parent, 'end', text=text, image=icon)
+        else:
+            item = self.tree.insert(parent, 'end', text=text)
+        
+        self._item_nodes[item] = node
+        self._node_items[node] = item
+        if node.children:
+            self.tree.insert(item, 'end', text='...')
+            self._unpopulated.add(item)
+        return item
+    
+    def _populate_children(self, item: str):
+        """将占位节点替换为实际的下一级子节点"""
+        if item not in self._unpopulated:
+            return
+        self._unpopulated.discard(item)
+        self.tree.delete(*self.tree.get_children(item))
+        for child in self._item_nodes[item].children.values():
+            self._insert_node(item, child)
+    
+    def _on_tree_open(self, event):
+        """展开节点时插入其子节点"""
+        self._populate_children(self.tree.focus())
+    
+    def _on_model_change(self, event: str, node: FolderNode):
+        """根据模型修改事件更新树形视图"""
+        if event == 'add':
+            parent_item = self._node_items.get(node.parent)
+            if parent_item is None:
+                return
+            if parent_item in self._unpopulated:
+                return
+            if len(node.parent.children) == 1 and not self.tree.item(parent_item, 'open'):
+                # 父节点原本没有子目录: 添加占位节点, 展开时再插入
+                self.tree.insert(parent_item, 'end', text='...')
+                self._unpopulated.add(parent_item)
             else:
-                folder_id = self.tree.insert(parent, 'end', text=folder)
-            
-            if isinstance(content, dict):
-                # 过滤掉元数据键
-                subfolders = {k: v for k, v in content.items() if not k.startswith('_')}
-                if subfolders:
-                    self._build_tree(folder_id, subfolders)
+                self._insert_node(parent_item, node)
+        elif event == 'remove':
+            item = self._node_items.get(node)
+            if item is not None:
+                self._forget_items(item)
+                self.tree.delete(item)
+            parent_item = self._node_items.get(node.parent)
+            if parent_item in self._unpopulated and not node.parent.children:
+                # 移除不再需要的占位节点
+                self.tree.delete(*self.tree.get_children(parent_item))
+                self._unpopulated.discard(parent_item)
+        elif event == 'icon':
+            item = self._node_items.get(node)
+            if item is not None:
+                icon = self._get_tree_icon(node.icon) if node.icon else None
+                self.tree.item(item, image=icon or '')
+        # 索引订阅了同一事件, 待其处理完后再刷新显示中的搜索结果
+        if self.search_var.get().strip():
+            self.root.after_idle(self._on_search)
+    
+    def _on_search(self):
+        """输入搜索内容时更新结果列表"""
+        query = self.search_var.get()
+        if self.model is None or not query.strip():
+            self._search_matches = []
+        else:
+            if self._index is None:
+                self._index = FolderIndex(self.model)
+            self._search_matches = self._index.search(query)
+        
+        self.search_results.delete(0, tk.END)
+        for node in self._search_matches:
+            self.search_results.insert(tk.END, '/'.join(node.path()))
+        if self._search_matches:
+            self.search_results.pack(fill=tk.X, pady=(0, 5), before=self.tree)
+        else:
+            self.search_results.pack_forget()
+    
+    def _on_search_select(self, event):
+        """选择搜索结果时展开并定位到对应目录"""
+        selection = self.search_results.curselection()
+        if selection:
+            self._reveal(self._search_matches[selection[0]])
+    
+    def _reveal(self, node: FolderNode):
+        """逐级插入并展开上级目录, 然后选中并滚动到该目录"""
+        ancestors = []
+        current = node.parent
+        while current is not None:
+            ancestors.append(current)
+            current = current.parent
+        for ancestor in reversed(ancestors):
+            item = self._node_items[ancestor]
+            self._populate_children(item)
+            self.tree.item(item, open=True)
+        item = self._node_items[node]
+        self.tree.selection_set(item)
+        self.tree.focus(item)
+        self.tree.see(item)
     
     def _show_context_menu(self, event):
         """显示右键菜单"""
@@ -358,37 +1209,90 @@ class ConfigEditorGUI:
         if selected:
             name = simpledialog.askstring("新建目录", "请输入目录名:")
             if name:
-                # 添加新节点
-                new_item = self.tree.insert(selected[0], 'end', text=name)
-                # 展开父节点
+                # 先插入已有子节点, 新节点由模型事件插入
+                self._populate_children(selected[0])
                 self.tree.item(selected[0], open=True)
+                try:
+                    node = self.model.add_child(self._item_nodes[selected[0]], name)
+                except ValueError as e:
+                    messagebox.showwarning("警告", str(e))
+                    return
+                new_item = self._node_items[node]
                 # 选中新节点
                 self.tree.selection_set(new_item)
-                # 确保新节点见
+                # 确保新节点可见
                 self.tree.see(new_item)
                 # 立即保存更改
-                self.folder_structure = {"folders": self._get_folder_structure('')}
                 self._auto_save()
     
     def _delete_folder(self):
         """删除选中的目录"""
         selected = self.tree.selection()
-        if selected and self.tree.item(selected[0])['text'] != '根目录':
-            self.tree.delete(selected[0])
+        if selected and self._item_nodes[selected[0]].parent is not None:
+            self.model.remove(self._item_nodes[selected[0]])
             # 立即保存更改
-            self.folder_structure = {"folders": self._get_folder_structure('')}
             self._auto_save()
     
+    def _forget_items(self, item: str):
+        """移除已插入的节点及其子孙节点的映射"""
+        stack = [item]
+        while stack:
+            current = stack.pop()
+            node = self._item_nodes.pop(current, None)
+            if node is not None:
+                del self._node_items[node]
+                self._unpopulated.discard(current)
+                stack.extend(self.tree.get_children(current))
+    
     def _auto_save(self):
-        """自动存当前配置"""
+        """标记配置已修改, 短暂延迟后合并保存"""
         if not self.current_file:
             return
         
+        self._save_dirty = True
+        if self._save_job is not None:
+            self.root.after_cancel(self._save_job)
+        self._save_job = self.root.after(AUTO_SAVE_DELAY_MS, self._flush_save)
+    
+    def _flush_save(self):
+        """将未保存的修改提交给后台写入线程"""
+        if self._save_job is not None:
+            self.root.after_cancel(self._save_job)
+            self._save_job = None
+        if not (self._save_dirty and self.current_file and self.model):
+            return
+        
+        self._save_dirty = False
+        self._saver.submit(self.current_file, self.model.to_config())
+        self.root.after(200, self._check_save_errors)
+    
+    def _save_now(self):
+        """立即保存并等待写入完成"""
+        self._flush_save()
+        self._saver.wait()
+        self._report_save_errors()
+    
+    def _report_save_errors(self):
+        """提示后台写入失败"""
         try:
-            with open(self.current_file, 'w', encoding='utf-8') as f:
-                json.dump(self.folder_structure, f, indent=4, ensure_ascii=False)
-        except Exception as e:
-            messagebox.showerror("错误", f"自动保存失败: {str(e)}")
+            while True:
+                path, e = self._saver.errors.get_nowait()
+                messagebox.showerror("错误", f"自动保存失败 {path}: {str(e)}")
+        except queue.Empty:
+            pass
+    
+    def _check_save_errors(self):
+        """检查写入结果, 写入未完成时继续等待"""
+        self._report_save_errors()
+        if self._saver.busy:
+            self.root.after(200, self._check_save_errors)
+    
+    def on_close(self):
+        """关闭窗口前写入未保存的修改"""
+        self._flush_save()
+        self._saver.close()
+        self._report_save_errors()
+        self.root.destroy()
     
     def _new_config(self):
         """创建新配置文件"""
@@ -396,49 +1300,188 @@ class ConfigEditorGUI:
         if filename:
             if not filename.endswith('.json'):
                 filename += '.json'
-            self.folder_structure = {
-                "folders": {
-                    "新文件夹": {}
-                }
-            }
+            # 先保存之前配置的修改
+            self._save_now()
+            self._set_model(FolderModel({
+                "新文件夹": {}
+            }))
             self.current_file = filename
             self._auto_save()
+            # 新文件需立即写入才能出现在列表中
+            self._save_now()
             self._load_configs()
             self._update_tree()
     
-    def _get_folder_structure(self, node: str) -> Dict:
-        """递归获取目录结构"""
-        structure = {}
-        children = self.tree.get_children(node)
-        for child in children:
-            item = self.tree.item(child)
-            child_text = item['text']
-            # 跳过根节
-            if child_text == '根目录':
-                structure = self._get_folder_structure(child)
-            else:
-                # 修改结构以匹配创建函数的预期格式
-                subfolders = self._get_folder_structure(child)
-                if subfolders:
-                    structure[child_text] = subfolders
-                else:
-                    structure[child_text] = {}
-        return structure
+    def _import_config(self):
+        """将已有目录树导入为新的配置文件"""
+        source = filedialog.askdirectory(title="选择要导入的目录")
+        if not source:
+            return
+        filename = simpledialog.askstring("导入目录", "请输入配置文件名:")
+        if not filename:
+            return
+        if not filename.endswith('.json'):
+            filename += '.json'
+        if os.path.exists(filename) and not messagebox.askyesno(
+                "确认覆盖", f"配置文件 {filename} 已存在, 导入结果将覆盖它, 是否继续?"):
+            return
+        
+        # 在后台线程中遍历目录, 完成后加载生成的配置
+        result = queue.Queue()
+        
+        def worker():
+            try:
+                skipped = []
+                result.put(('done', (import_folder_tree(source, skipped=skipped), skipped)))
+            except Exception as e:
+                result.put(('error', e))
+        
+        def poll():
+            try:
+                status, value = result.get_nowait()
+            except queue.Empty:
+                self.root.after(100, poll)
+                return
+            self.root.configure(cursor='')
+            if status == 'error':
+                messagebox.showerror("错误", f"导入目录失败: {str(value)}")
+                return
+            data, skipped = value
+            if filename == self.current_file:
+                # 丢弃当前配置未保存的修改, 避免切换配置时被写回覆盖导入结果
+                if self._save_job is not None:
+                    self.root.after_cancel(self._save_job)
+                    self._save_job = None
+                self._save_dirty = False
+                self._saver.wait()
+            try:
+                write_json_atomic(filename, data, indent=4)
+            except OSError as e:
+                messagebox.showerror("错误", f"无法保存配置文件: {str(e)}")
+                return
+            self._load_configs()
+            self._load_config_file(filename)
+            if skipped:
+                listed = '\n'.join(skipped[:20])
+                messagebox.showwarning(
+                    "部分目录未导入",
+                    f"以下 {len(skipped)} 个目录名以下划线开头或含 {{a..b}}, 无法写入配置, 已跳过:\n{listed}"
+                )
+        
+        self.root.configure(cursor='watch')
+        threading.Thread(target=worker, daemon=True).start()
+        self.root.after(100, poll)
     
     def _create_folders(self):
-        """创建实际的目录结构"""
+        """在后台线程中创建实际的目录结构"""
         if not self.current_file:
             messagebox.showwarning("警告", "请先选择或创建配置文件")
             return
         
-        try:
-            folders = self._get_folder_structure(
-                next(iter(self.tree.get_children('')))  # 获取根节点
-            )
-            create_folders('.', folders, self.current_file)
-            messagebox.showinfo("成功", "目录结构创建完成")
-        except Exception as e:
-            messagebox.showerror("错误", f"创建目录失败: {str(e)}")
+        # 导出一份独立的配置, 避免后台线程与界面编辑同时访问
+        folders = self.model.to_config()['folders']
+        # 开始之前检查配置, 有问题时不创建任何目录
+        problems = validate_config(folders, '.')
+        if problems:
+            messagebox.showerror("配置有误", str(PreflightError(problems)))
+            return
+        events = queue.Queue()
+        cancel = threading.Event()
+        
+        def worker():
+            try:
+                stats = create_folders(
+                    '.', folders, jobs=DEFAULT_JOBS, cancel=cancel, resume=True, validate=False,
+                    progress=lambda done, total: events.put(('progress', done, total)),
+                    icon_progress=lambda done, total: events.put(('icons', done, total))
+                )
+                events.put(('done', list(stats.failed), stats.counters['folders_failed']))
+            except Exception as e:
+                events.put(('error', str(e)))
+        
+        self.create_button.configure(state=tk.DISABLED)
+        self._show_create_progress(events, cancel)
+        threading.Thread(target=worker, daemon=True).start()
+    
+    def _show_create_progress(self, events: queue.Queue, cancel: threading.Event):
+        """显示创建进度窗口, 通过root.after轮询后台线程的消息"""
+        dialog = tk.Toplevel(self.root)
+        dialog.title("创建目录")
+        dialog.geometry("400x130")
+        dialog.transient(self.root)
+        dialog.resizable(False, False)
+        
+        frame = ttk.Frame(dialog, padding="10")
+        frame.pack(fill=tk.BOTH, expand=True)
+        
+        progress_bar = ttk.Progressbar(frame, mode='determinate', maximum=1)
+        progress_bar.pack(fill=tk.X, pady=(0, 10))
+        status = ttk.Label(frame, text="正在生成创建计划...")
+        status.pack(anchor='w')
+        
+        def on_cancel():
+            cancel.set()
+            cancel_button.configure(state=tk.DISABLED)
+            status.configure(text="正在取消...")
+        
+        cancel_button = ttk.Button(frame, text="取消", command=on_cancel)
+        cancel_button.pack(side=tk.RIGHT, pady=(10, 0))
+        dialog.protocol("WM_DELETE_WINDOW", on_cancel)
+        
+        # 以收到第一条目录进度消息的时间作为速率计算起点 (不含生成计划与图标的耗时)
+        start = None
+        
+        def finish():
+            dialog.destroy()
+            self.create_button.configure(state=tk.NORMAL)
+        
+        def poll():
+            nonlocal start
+            latest = None
+            try:
+                while True:
+                    event = events.get_nowait()
+                    if event[0] in ('progress', 'icons'):
+                        latest = event
+                        continue
+                    finish()
+                    if event[0] == 'error':
+                        messagebox.showerror("错误", f"创建目录失败: {event[1]}")
+                    elif cancel.is_set():
+                        messagebox.showinfo("已取消", "目录创建已取消, 已完成的部分会在下次创建时跳过")
+                    elif event[1] or event[2]:
+                        _, failed, failed_count = event
+                        listed = '\n'.join(failed[:10])
+                        more = f"\n... 等共 {len(failed)} 个" if len(failed) > 10 else ''
+                        messagebox.showwarning(
+                            "部分目录未完成",
+                            f"{failed_count} 个目录创建或设置图标失败, 共 {len(failed)} 个目录未完成 "
+                            f"(失败目录的子目录不会执行), 重新创建时会再次处理:\n{listed}{more}"
+                        )
+                    else:
+                        messagebox.showinfo("成功", "目录结构创建完成")
+                    return
+            except queue.Empty:
+                pass
+            
+            if latest is not None and not cancel.is_set():
+                kind, done, total = latest
+                if kind == 'icons':
+                    # 生成ico阶段, 目录创建尚未开始
+                    progress_bar.configure(maximum=max(total, 1), value=done)
+                    status.configure(text=f"正在生成图标 {done}/{total}...")
+                    dialog.after(100, poll)
+                    return
+                if start is None:
+                    start = time.monotonic()
+                elapsed = max(time.monotonic() - start, 1e-6)
+                rate = done / elapsed
+                eta = (total - done) / rate if rate else 0
+                progress_bar.configure(maximum=max(total, 1), value=done)
+                status.configure(text=f"已完成 {done}/{total} 个目录, {rate:.0f} 个/秒, 预计剩余 {eta:.0f} 秒")
+            dialog.after(100, poll)
+        
+        dialog.after(100, poll)
     
     def _delete_config(self):
         """删除当前选中的配置文件"""
@@ -447,8 +1490,10 @@ class ConfigEditorGUI:
             messagebox.showwarning("警告", "请先选择要删除的配置文件")
             return
         
-        filename = self.config_listbox.get(selection[0])
+        filename = self._config_files[selection[0]]
         if messagebox.askyesno("确认删除", f"确定要删除配置文件 {filename} 吗？"):
+            # 等待后台写入完成, 避免删除后又被写回
+            self._save_now()
             try:
                 os.remove(filename)
                 self._load_configs()  # 重新加载配置文件列表
@@ -456,8 +1501,8 @@ class ConfigEditorGUI:
                 # 如果删除的是当前打开的配置文件，清空树形视图
                 if filename == self.current_file:
                     self.current_file = None
-                    self.folder_structure = {}
-                    self.tree.delete(*self.tree.get_children())
+                    self._set_model(None)
+                    self._clear_tree()
             except Exception as e:
                 messagebox.showerror("错误", f"删除失败: {str(e)}")
     
@@ -467,87 +1512,1329 @@ def init_icon_dir() -> None:
     if not os.path.exists(icon_dir):
         os.makedirs(icon_dir)
 
-def create_folders(base_path: str, folders: Dict, current_file) -> None:
-    """递归创建目录结构"""
-    for folder_name, content in folders.items():
+
+class IconCache:
+    """按源文件内容哈希缓存转换后的ico文件"""
+    
+    def __init__(self, cache_dir: str = ICON_CACHE_DIR, sizes=ICO_SIZES):
+        self.cache_dir = cache_dir
+        self.sizes = tuple(sizes)
+        # 命中/未命中计数
+        self.hits = 0
+        self.misses = 0
+        # 源图片路径 -> 生成ico的耗时(秒)
+        self.build_times: Dict[str, float] = {}
+        # (路径, 修改时间, 大小) -> 内容哈希, 避免同一次运行中重复读取源文件
+        self._digests: Dict[Tuple[str, int, int], str] = {}
+        # 并行执行时保证同一图标只转换一次
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+    
+    def source_digest(self, src_path: str) -> str:
+        """计算源图片与尺寸集合的哈希"""
+        st = os.stat(src_path)
+        key = (os.path.abspath(src_path), st.st_mtime_ns, st.st_size)
+        digest = self._digests.get(key)
+        if digest is None:
+            h = hashlib.sha1(repr(self.sizes).encode())
+            with open(src_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    h.update(chunk)
+            digest = h.hexdigest()
+            self._digests[key] = digest
+        return digest
+    
+    def get(self, src_path: str) -> str:
+        """返回源图片对应的缓存ico路径, 不存在时进行转换"""
+        return self.fetch(src_path)[0]
+    
+    def fetch(self, src_path: str) -> Tuple[str, bool]:
+        """返回 (缓存ico路径, 本次调用是否进行了转换), 供调用方按运行分别计数"""
+        digest = self.source_digest(src_path)
+        cached_path = os.path.join(self.cache_dir, digest + '.ico')
+        with self._lock:
+            key_lock = self._key_locks.setdefault(digest, threading.Lock())
+        
+        with key_lock:
+            if os.path.exists(cached_path):
+                with self._lock:
+                    self.hits += 1
+                return cached_path, False
+            
+            with self._lock:
+                self.misses += 1
+            start = time.perf_counter()
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp_path = f"{cached_path}.{threading.get_ident()}.tmp"
+            self.build(src_path, temp_path)
+            os.replace(temp_path, cached_path)
+            self.build_times[src_path] = time.perf_counter() - start
+            return cached_path, True
+    
+    def build(self, src_path: str, dest_path: str) -> None:
+        """生成包含各尺寸的ico文件
+        
+        从大到小逐个尺寸生成, 每一级先用reduce按整数倍缩小上一级的结果,
+        再做一次LANCZOS缩放到目标尺寸, 避免每个尺寸都从原图完整缩放
+        """
+        from PIL import Image
+        largest = max(max(size) for size in self.sizes)
+        img = Image.open(src_path)
+        # JPEG等格式可在解码阶段直接缩小
+        img.draft('RGB', (largest, largest))
+        img = img.convert('RGBA')
+        if max(img.size) < largest:
+            logger.warning("图标 %s 尺寸为 %dx%d, 小于 %d, 将被放大", src_path, *img.size, largest)
+        # 非正方形图片居中放到透明的正方形画布上
+        if img.width != img.height:
+            side = max(img.size)
+            canvas = Image.new('RGBA', (side, side), (0, 0, 0, 0))
+            canvas.paste(img, ((side - img.width) // 2, (side - img.height) // 2))
+            img = canvas
+        
+        frames = []
+        current = img
+        for size in sorted(self.sizes, key=max, reverse=True):
+            factor = min(current.width // size[0], current.height // size[1])
+            if factor >= 2:
+                current = current.reduce(factor)
+            if current.size != size:
+                current = current.resize(size, Image.LANCZOS)
+            frames.append(current)
+        frames[0].save(dest_path, format='ICO', sizes=[frame.size for frame in frames],
+                       append_images=frames[1:])
+    
+    def check(self, src_path: str) -> None:
+        """只读取文件头检查源图片能否识别, 不能时抛出异常"""
+        from PIL import Image
+        with Image.open(src_path) as img:
+            if not img.width or not img.height:
+                raise ValueError("图片尺寸为0")
+    
+    def prepare(self, sources: List[str], jobs: int = 1, build: bool = True,
+                stats: Optional['RunStats'] = None,
+                progress: Optional[Callable[[int, int], None]] = None,
+                cancel: Optional[threading.Event] = None) -> List[str]:
+        """执行前为每个源图片生成一次ico (build为False时只检查), 返回无法处理的图片问题列表
+        
+        stats指定时将本次实际进行的转换及其耗时计入该运行;
+        progress以(已处理图片数, 图片总数)回调进度; cancel被设置后不再处理新的图片
+        """
+        total = len(sources)
+        finished = 0
+        progress_lock = threading.Lock()
+        
+        def handle(src_path: str) -> Optional[str]:
+            nonlocal finished
+            if cancel is not None and cancel.is_set():
+                return None
+            try:
+                if build:
+                    _, built = self.fetch(src_path)
+                    if built and stats is not None:
+                        stats.record_build(src_path, self.build_times[src_path])
+                else:
+                    self.check(src_path)
+            except Exception as e:
+                return f"{src_path}: 无法生成图标 ({e})"
+            finally:
+                if progress is not None:
+                    with progress_lock:
+                        finished += 1
+                        progress(finished, total)
+            return None
+        
+        if jobs > 1 and len(sources) > 1:
+            with ThreadPoolExecutor(max_workers=jobs) as pool:
+                results = list(pool.map(handle, sources))
+        else:
+            results = [handle(src_path) for src_path in sources]
+        return [problem for problem in results if problem]
+
+
+class ThumbnailLoader:
+    """在线程池中解码图标缩略图, 并按 (路径, 修改时间) 缓存到磁盘"""
+    
+    def __init__(self, cache_dir: str = THUMBNAIL_CACHE_DIR, size: int = THUMBNAIL_SIZE, workers: int = 4):
+        self.cache_dir = cache_dir
+        self.size = size
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+    
+    def cache_path(self, icon_path: str, mtime_ns: int) -> str:
+        key = f"{os.path.abspath(icon_path)}|{mtime_ns}|{self.size}"
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.png')
+    
+    def load(self, icon_path: str, mtime_ns: int):
+        """返回缩略图(PIL图像), 磁盘缓存不存在时解码原图并写入缓存"""
+        from PIL import Image
+        cache_path = self.cache_path(icon_path, mtime_ns)
+        try:
+            thumb = Image.open(cache_path)
+            thumb.load()
+            return thumb
+        except OSError:
+            pass
+        
+        img = Image.open(icon_path)
+        # JPEG等格式可在解码阶段直接缩小
+        img.draft('RGB', (self.size, self.size))
+        # 调色板、1位等模式不支持reduce, 统一转换为RGBA
+        img = img.convert('RGBA')
+        # 大图先按整数倍快速缩小, 再做最终的LANCZOS缩放
+        factor = min(img.size) // (self.size * 2)
+        if factor >= 2:
+            img = img.reduce(factor)
+        thumb = img.resize((self.size, self.size), Image.LANCZOS)
+        
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp_path = f"{cache_path}.{threading.get_ident()}.tmp"
+            thumb.save(temp_path, format='PNG')
+            os.replace(temp_path, cache_path)
+        except OSError as e:
+            logger.warning("无法写入缩略图缓存 %s: %s", cache_path, e)
+        return thumb
+    
+    def submit(self, icon_path: str, mtime_ns: int):
+        return self._pool.submit(self.load, icon_path, mtime_ns)
+
+
+class RunStats:
+    """一次应用过程的计数器与各阶段耗时
+    
+    并发执行时, mkdir/icon/ini阶段的耗时为各线程耗时之和
+    """
+    
+    # folders_skipped: 与上次应用相比没有变化而不必处理的目录;
+    # folders_not_run: 因取消或父目录失败而未执行的目录, 与folders_failed一同列入failed
+    COUNTERS = (
+        'nodes', 'folders_created', 'folders_existing', 'folders_skipped', 'folders_failed',
+        'folders_not_run', 'icons_converted', 'icon_cache_hits', 'icons_copied', 'ini_written',
+        'files_removed', 'attrib_calls', 'cache_flushes', 'folders_resumed', 'icons_linked',
+    )
+    STAGES = ('parse', 'validate', 'plan', 'icon_build', 'mkdir', 'icon', 'ini', 'attrib', 'cache_flush')
+    
+    def __init__(self):
+        self.counters: Dict[str, int] = dict.fromkeys(self.COUNTERS, 0)
+        self.timings: Dict[str, float] = dict.fromkeys(self.STAGES, 0.0)
+        # 计划中各类操作的数量
+        self.operations: Dict[str, int] = {}
+        # 源图片 -> 本次生成ico的耗时(秒)
+        self.icon_builds: Dict[str, float] = {}
+        self.failed: List[str] = []
+        self._lock = threading.Lock()
+    
+    def incr(self, name: str, count: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += count
+    
+    def record_build(self, src_path: str, seconds: float) -> None:
+        """记录本次运行中一个源图片的ico转换"""
+        with self._lock:
+            self.counters['icons_converted'] += 1
+            self.icon_builds[src_path] = seconds
+    
+    def add_time(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+    
+    @contextmanager
+    def timer(self, stage: str):
+        """统计代码块耗时, 累加到指定阶段"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - start)
+    
+    def to_dict(self) -> Dict:
+        return {
+            'counters': dict(self.counters),
+            'timings': {k: round(v, 6) for k, v in self.timings.items()},
+            'operations': dict(self.operations),
+            'icon_builds': {k: round(v, 6) for k, v in self.icon_builds.items()},
+            'failed': list(self.failed),
+        }
+    
+    def write_report(self, path: str) -> None:
+        """写出JSON格式的运行报告"""
+        write_json_atomic(path, self.to_dict(), indent=2)
+
+
+class PreflightError(ValueError):
+    """执行前的检查发现问题, 此时尚未修改任何文件"""
+    
+    # 异常消息中最多列出的问题数
+    MAX_LISTED = 20
+    
+    def __init__(self, problems: List[str]):
+        self.problems = problems
+        listed = '\n'.join(problems[:self.MAX_LISTED])
+        more = f"\n... 共 {len(problems)} 个问题" if len(problems) > self.MAX_LISTED else ''
+        super().__init__(f"发现 {len(problems)} 个问题:\n{listed}{more}")
+
+
+class PlanOp(NamedTuple):
+    """创建计划中的单个操作"""
+    kind: str       # mkdir / icon / ini / remove / attrib / refresh
+    path: str       # 操作目标的绝对路径
+    arg: Any = None # icon: 源图片路径; ini: 文件内容; attrib: 属性参数
+
+
+# 目录名中的数字范围模板, 如 Shot_{0001..2000}
+NAME_RANGE_PATTERN = re.compile(r'\{(\d+)\.\.(\d+)\}')
+
+
+def _name_ranges(name: str) -> Tuple[List[str], List[range], List[int]]:
+    """拆分模板目录名, 返回 (固定文本片段, 各数字范围, 各范围的补零宽度)"""
+    parts = NAME_RANGE_PATTERN.split(name)
+    texts = parts[0::3]
+    ranges = []
+    widths = []
+    for start, end in zip(parts[1::3], parts[2::3]):
+        # 与shell的{01..10}一致, 任一端有前导零时按较长一端补零
+        padded = (len(start) > 1 and start[0] == '0') or (len(end) > 1 and end[0] == '0')
+        widths.append(max(len(start), len(end)) if padded else 0)
+        first, last = int(start), int(end)
+        step = 1 if last >= first else -1
+        ranges.append(range(first, last + step, step))
+    return texts, ranges, widths
+
+
+def template_size(name: str) -> int:
+    """模板目录名展开后的目录数, 普通目录名返回1"""
+    count = 1
+    for values in _name_ranges(name)[1]:
+        count *= len(values)
+    return count
+
+
+def expand_folder_name(name: str) -> Iterator[str]:
+    """逐个产出模板目录名展开后的目录名, 多个范围按组合展开, 普通目录名原样产出"""
+    texts, ranges, widths = _name_ranges(name)
+    if not ranges:
+        yield name
+        return
+    for values in itertools.product(*ranges):
+        pieces = [texts[0]]
+        for value, width, text in zip(values, widths, texts[1:]):
+            pieces.append(str(value).zfill(width))
+            pieces.append(text)
+        yield ''.join(pieces)
+
+
+def _iter_child_folders(content: Dict) -> Iterator[Tuple[str, Dict]]:
+    """产出节点的 (子目录名, 子节点内容), 模板目录按需展开并共享同一份子节点内容"""
+    for name, child in content.items():
         # 跳过以下划线开头的元数据键
-        if folder_name.startswith('_'):
+        if name.startswith('_'):
+            continue
+        if not isinstance(child, dict):
+            child = {}
+        for folder_name in expand_folder_name(name):
+            yield folder_name, child
+
+
+def iter_folder_nodes(base_path: str, folders: Union[Dict, NodeStore]) -> Iterator[Tuple[str, Dict]]:
+    """按父目录先于子目录的顺序遍历配置, 产出 (目录绝对路径, 节点内容)
+    
+    模板目录在遍历时逐个展开, 不会在内存中生成完整的目录树
+    """
+    if isinstance(folders, NodeStore):
+        yield from folders.iter_nodes(base_path)
+        return
+    stack = [(os.path.abspath(base_path), _iter_child_folders(folders))]
+    while stack:
+        parent_path, items = stack[-1]
+        for folder_name, content in items:
+            folder_path = os.path.join(parent_path, folder_name)
+            yield folder_path, content
+            stack.append((folder_path, _iter_child_folders(content)))
+            break
+        else:
+            stack.pop()
+
+
+# Windows目录名中不允许的字符
+INVALID_NAME_PATTERN = re.compile(r'[<>:"/\\|?*\x00-\x1f]')
+# Windows保留的设备名, 带扩展名时同样不可用
+RESERVED_NAMES = frozenset(
+    ['CON', 'PRN', 'AUX', 'NUL'] + [f'{prefix}{i}' for prefix in ('COM', 'LPT') for i in range(1, 10)]
+)
+
+
+def _name_problem(name: str) -> Optional[str]:
+    """检查单个目录名在Windows上是否可用, 返回问题描述"""
+    if not name.strip():
+        return "目录名为空"
+    match = INVALID_NAME_PATTERN.search(name)
+    if match:
+        return f"目录名包含非法字符 {match.group()!r}"
+    if name[-1] in ' .':
+        return "目录名不能以空格或句点结尾"
+    if name.partition('.')[0].rstrip(' ').upper() in RESERVED_NAMES:
+        return "目录名为Windows保留名称"
+    return None
+
+
+def validate_config(folders: Union[Dict, NodeStore], base_path: str = '.',
+                    check_icons: bool = True) -> List[str]:
+    """在执行任何文件操作之前一次遍历检查配置, 返回带完整路径的问题列表
+    
+    检查目录名、同级重名 (不区分大小写, 含模板展开后的名称)、路径长度与图标文件;
+    模板目录的子树只检查一次, 路径长度按展开后最长的名称计算
+    """
+    base = os.path.abspath(base_path)
+    problems = []
+    # 目录名 -> 问题描述, 相同名称只检查一次
+    names: Dict[str, Optional[str]] = {}
+    icons: Dict[str, bool] = {}
+    sep = os.sep
+    root = folders.root if isinstance(folders, NodeStore) else folders
+    # (节点内容, 以分隔符结尾的父目录路径)
+    stack = [(root, base if base.endswith(sep) else base + sep)]
+    while stack:
+        content, prefix = stack.pop()
+        if isinstance(content, CompactNode):
+            children = content.children
+        elif isinstance(content, dict):
+            children = [(k, v) for k, v in content.items() if k[:1] != '_']
+        else:
             continue
+        
+        templates = False
+        for name, child in children:
+            folder_path = prefix + name
+            longest = name
+            expanded_names = (name,)
+            if '{' in name and NAME_RANGE_PATTERN.search(name):
+                templates = True
+                expanded_names = list(expand_folder_name(name))
+                longest = max(expanded_names, key=len)
+            # 模板展开后的每个名称都要检查, 如 COM{0..9} 中的 COM1
+            for expanded_name in expanded_names:
+                if expanded_name not in names:
+                    names[expanded_name] = _name_problem(expanded_name)
+                if names[expanded_name]:
+                    problems.append(f"{prefix}{expanded_name}: {names[expanded_name]}")
+            if len(prefix) + len(longest) > MAX_FOLDER_PATH:
+                problems.append(f"{folder_path}: 路径长度超过 {MAX_FOLDER_PATH} 个字符")
             
-        # 构建完整路径
-        folder_path = os.path.join(base_path, folder_name)
+            if type(child) is dict:
+                icon_path = child.get('_icon') if child else None
+            elif type(child) is CompactNode:
+                icon_path = child.meta.get('_icon')
+            else:
+                continue
+            if icon_path is not None:
+                if not isinstance(icon_path, str):
+                    problems.append(f"{folder_path}: _icon 不是文件路径")
+                elif check_icons and icon_path:
+                    exists = icons.get(icon_path)
+                    if exists is None:
+                        exists = icons[icon_path] = os.path.isfile(icon_path)
+                    if not exists:
+                        problems.append(f"{folder_path}: 图标文件不存在 {icon_path}")
+            # 子目录的路径长度同样按最长的展开名计算; 叶子目录不必入栈
+            if child and (type(child) is dict or child.children):
+                stack.append((child, prefix + longest + sep))
         
-        # 创建目录
+        # JSON中的键本身不会重复, 只需检查忽略大小写后或模板展开后的重名
+        if len(children) > 1 or templates:
+            if templates:
+                expanded = [folder_name for name, _ in children for folder_name in expand_folder_name(name)]
+            else:
+                expanded = [name for name, _ in children]
+            if len({name.casefold() for name in expanded}) != len(expanded):
+                seen = set()
+                for folder_name in expanded:
+                    key = folder_name.casefold()
+                    if key in seen:
+                        problems.append(f"{prefix}{folder_name}: 与同级目录重名")
+                    seen.add(key)
+    return problems
+
+
+class Manifest:
+    """记录目标目录下每个节点上次应用的状态, 用于增量应用"""
+    
+    FILENAME = '.filestree-manifest.json'
+    
+    def __init__(self, base_path: str, nodes: Optional[Dict[str, Dict]] = None):
+        self.base_path = os.path.abspath(base_path)
+        self.path = os.path.join(self.base_path, self.FILENAME)
+        # 相对路径 -> {'icon': 源图片哈希, 'ico': 图标文件名, 'ini': desktop.ini内容}
+        self.nodes: Dict[str, Dict] = nodes or {}
+    
+    @classmethod
+    def load(cls, base_path: str) -> 'Manifest':
+        """读取已有清单, 不存在或损坏时返回空清单"""
+        manifest = cls(base_path)
         try:
-            if not os.path.exists(folder_path):
-                os.makedirs(folder_path)
-            
-            # 调试输出
-            print(f"处理文件夹: {folder_name}")
-            print(f"内容类型: {type(content)}")
-            print(f"内容: {content}")
-            
-        except Exception as e:
-            print(f"创建目录失败 {folder_path}: {str(e)}")
+            with open(manifest.path, 'r', encoding='utf-8') as f:
+                manifest.nodes = json.load(f).get('nodes', {})
+        except (OSError, ValueError) as e:
+            if os.path.exists(manifest.path):
+                logger.warning("无法读取清单 %s: %s", manifest.path, e)
+        return manifest
+    
+    def key(self, folder_path: str) -> str:
+        """目录绝对路径对应的清单键"""
+        return os.path.relpath(folder_path, self.base_path).replace(os.sep, '/')
+    
+    def discard(self, folder_paths) -> None:
+        """移除应用失败的目录及其子目录的记录, 下次应用时重新处理"""
+        prefixes = {self.key(folder_path) for folder_path in folder_paths}
+        if not prefixes:
+            return
+        for key in list(self.nodes):
+            # 检查键本身及其所有祖先是否在失败列表中
+            parts = key.split('/')
+            if any('/'.join(parts[:i]) in prefixes for i in range(1, len(parts) + 1)):
+                del self.nodes[key]
+    
+    def save(self) -> None:
+        """原子写入清单文件"""
+        os.makedirs(self.base_path, exist_ok=True)
+        write_json_atomic(self.path, {'version': 1, 'nodes': self.nodes}, separators=(',', ':'))
+
+
+class Journal:
+    """应用过程中逐个记录已完成的目录, 中断后重新运行时可跳过这些目录
+    
+    每行格式为 "<状态哈希> <相对路径>", 运行成功结束后删除
+    """
+    
+    FILENAME = '.filestree-journal'
+    
+    def __init__(self, base_path: str):
+        self.base_path = os.path.abspath(base_path)
+        self.path = os.path.join(self.base_path, self.FILENAME)
+        self._file = None
+    
+    @staticmethod
+    def state_digest(state: Optional[Dict]) -> str:
+        """节点目标状态的短哈希, 状态变化后旧记录不再生效"""
+        text = json.dumps(state, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+    
+    def load(self) -> Dict[str, str]:
+        """读取已完成的记录: 相对路径 -> 状态哈希"""
+        done = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    digest, sep, key = line.rstrip('\n').partition(' ')
+                    # 忽略中断时只写了一半的行
+                    if sep and len(digest) == 16:
+                        done[key] = digest
+        except OSError:
+            pass
+        return done
+    
+    def open(self, append: bool) -> None:
+        """开始记录, append为False时清空旧记录"""
+        os.makedirs(self.base_path, exist_ok=True)
+        self._file = open(self.path, 'a' if append else 'w', encoding='utf-8')
+    
+    def record(self, key: str, digest: str) -> None:
+        self._file.write(f"{digest} {key}\n")
+        # 立即写入, 进程被终止时已完成的记录不会丢失
+        self._file.flush()
+    
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+    
+    def remove(self) -> None:
+        self.close()
+        _remove_if_exists(self.path)
+
+
+def _resume_plan(plan: List[PlanOp], manifest: Manifest, done: Dict[str, str]) -> Tuple[List[PlanOp], int]:
+    """跳过日志中已完成且磁盘状态仍一致的目录, 返回 (新计划, 跳过的目录数)
+    
+    属性修改在运行结束时才批量应用, 中断时可能尚未生效, 因此保留这些目录的attrib操作
+    """
+    resumed_plan = []
+    resumed = 0
+    skip_node = False
+    for op in plan:
+        if op.kind == 'mkdir':
+            key = manifest.key(op.path)
+            state = manifest.nodes.get(key)
+            skip_node = (state is not None and done.get(key) == Journal.state_digest(state)
+                         and _is_applied(op.path, state))
+            resumed += skip_node
+        elif skip_node and op.kind != 'attrib':
+            continue
+        resumed_plan.append(op)
+    return resumed_plan, resumed
+
+
+def _is_applied(folder_path: str, state: Dict) -> bool:
+    """检查节点的目标状态是否仍存在于磁盘上"""
+    if not os.path.isdir(folder_path):
+        return False
+    if state.get('ico'):
+        return (os.path.exists(os.path.join(folder_path, state['ico']))
+                and os.path.exists(os.path.join(folder_path, 'desktop.ini')))
+    return True
+
+
+# compile_states产出的节点: (清单键, 目标状态, 源图片绝对路径)
+NodeState = Tuple[str, Dict, Optional[str]]
+
+
+def compile_states(folders: Union[Dict, NodeStore], icon_cache: Optional[IconCache] = None,
+                   digests: bool = True) -> Iterator[NodeState]:
+    """按父目录先于子目录的顺序产出每个节点的目标状态, 与目标目录无关, 可供多个目标目录共用
+    
+    digests为True时计算源图片哈希, 用于与清单比较
+    """
+    if digests and icon_cache is None:
+        icon_cache = IconCache()
+    # 以文件系统根目录为基准遍历, 去掉前缀即为相对路径
+    base = os.path.abspath(os.sep)
+    # 使用同一图标的目录共用同一个状态字典
+    states: Dict[Optional[str], Tuple[Dict, Optional[str]]] = {None: ({}, None)}
+    for folder_path, content in iter_folder_nodes(base, folders):
+        icon_path = content.get('_icon') or None
+        entry = states.get(icon_path)
+        if entry is None:
+            icon_name = os.path.splitext(os.path.basename(icon_path))[0] + '.ico'
+            state = {
+                'icon': None,
+                'ico': icon_name,
+                'ini': f"[.ShellClassInfo]\nIconResource=.\\{icon_name},0",
+            }
+            if digests:
+                try:
+                    state['icon'] = icon_cache.source_digest(icon_path)
+                except OSError:
+                    # 源图片不可读时总是重新生成, 由执行阶段报告错误
+                    pass
+            entry = states[icon_path] = (state, os.path.abspath(icon_path))
+        yield folder_path[len(base):].replace(os.sep, '/'), entry[0], entry[1]
+
+
+def compile_plan(base_path: str, folders: Union[Dict, NodeStore], manifest: Optional[Manifest] = None,
+                 icon_cache: Optional[IconCache] = None,
+                 states: Optional[List[NodeState]] = None,
+                 cancel: Optional[threading.Event] = None) -> List[PlanOp]:
+    """将配置一次性编译为扁平、有序的操作列表
+    
+    传入manifest时只生成与上次应用状态不同的增量操作, 并将manifest更新为目标状态;
+    传入states (compile_states的结果) 时不再遍历folders;
+    cancel被设置后停止编译, 此时返回的计划与manifest都不完整, 不应再执行或保存
+    """
+    if states is None:
+        states = compile_states(folders, icon_cache, digests=manifest is not None)
+    base = os.path.abspath(base_path)
+    previous = manifest.nodes if manifest is not None else {}
+    desired = {}
+    plan = []
+    for count, (key, state, icon_path) in enumerate(states):
+        if cancel is not None and count % 1024 == 0 and cancel.is_set():
+            break
+        folder_path = os.path.join(base, key if os.sep == '/' else key.replace('/', os.sep))
+        
+        old = None
+        if manifest is not None:
+            desired[key] = state
+            old = previous.get(key)
+            if old == state and state.get('icon', '') is not None and _is_applied(folder_path, state):
+                continue
+        
+        plan.append(PlanOp('mkdir', folder_path))
+        
+        # 移除上次应用后已被取消或替换的图标
+        desktop_ini_path = os.path.join(folder_path, 'desktop.ini')
+        if old and old.get('ico') and old['ico'] != state.get('ico'):
+            plan.append(PlanOp('remove', os.path.join(folder_path, old['ico'])))
+        if old and old.get('ini') and not state:
+            plan.append(PlanOp('remove', desktop_ini_path))
+            plan.append(PlanOp('attrib', folder_path, ('-r',)))
+        
+        if not state:
             continue
         
-        # 重新从选中的配置文件中读取folder_name中的_icon
-        with open(current_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            icon_path = data['folders'][folder_name]['_icon']
-            icon_path = os.path.join(base_path, icon_path)
+        final_icon_path = os.path.join(folder_path, state['ico'])
+        plan.append(PlanOp('icon', final_icon_path, icon_path))
+        plan.append(PlanOp('ini', desktop_ini_path, state['ini']))
+        # desktop.ini与icon文件设为系统隐藏文件, 文件夹设为只读
+        plan.append(PlanOp('attrib', desktop_ini_path, ('+s', '+h')))
+        plan.append(PlanOp('attrib', final_icon_path, ('+s', '+h')))
+        plan.append(PlanOp('attrib', folder_path, ('+r',)))
+    
+    if manifest is not None:
+        manifest.nodes = desired
+    
+    # 有图标变更时, 运行结束后统一刷新一次资源管理器图标缓存
+    if any(op.kind in ('icon', 'remove') for op in plan):
+        plan.append(PlanOp('refresh', os.path.abspath(base_path)))
+    return plan
 
-            # 复制图标到folder_path并创建desktop.ini文件
-            try:
-                filename = os.path.basename(icon_path)
-                icon_name = os.path.splitext(filename)[0] + '.ico'
-                temp_icon_path = os.path.join('.\图标', icon_name)#临时图标
-                print(temp_icon_path)
-                img = Image.open(icon_path)
-                img.save(temp_icon_path, format='ICO')
-
-                shutil.copy(temp_icon_path, folder_path)
-                os.remove(temp_icon_path)
-                
-                final_icon_path = os.path.join(folder_path, icon_name)
-                desktop_ini_path = os.path.join(folder_path, 'desktop.ini')
 
-                if os.path.exists(desktop_ini_path):
-                    os.remove(desktop_ini_path)
+def _remove_if_exists(path: str) -> None:
+    """删除已存在的文件(隐藏/系统文件无法直接覆盖写入)"""
+    if os.path.exists(path):
+        os.remove(path)
+
+
+# 资源管理器图标缓存清理命令, 合并为一次进程调用执行
+EXPLORER_CACHE_FLUSH_COMMANDS = (
+    "attrib -h -s -r \"%userprofile%\\AppData\\Local\\IconCache.db\"",
+    "del /f \"%userprofile%\\AppData\\Local\\IconCache.db\"",
+    "attrib /s /d -h -s -r \"%userprofile%\\AppData\\Local\\Microsoft\\Windows\\Explorer\\*\"",
+    "del /f \"%userprofile%\\AppData\\Local\\Microsoft\\Windows\\Explorer\\thumbcache_32.db\"",
+    "del /f \"%userprofile%\\AppData\\Local\\Microsoft\\Windows\\Explorer\\thumbcache_96.db\"",
+    "del /f \"%userprofile%\\AppData\\Local\\Microsoft\\Windows\\Explorer\\thumbcache_102.db\"",
+    "del /f \"%userprofile%\\AppData\\Local\\Microsoft\\Windows\\Explorer\\thumbcache_256.db\"",
+    "del /f \"%userprofile%\\AppData\\Local\\Microsoft\\Windows\\Explorer\\thumbcache_1024.db\"",
+    "del /f \"%userprofile%\\AppData\\Local\\Microsoft\\Windows\\Explorer\\thumbcache_idx.db\"",
+    "del /f \"%userprofile%\\AppData\\Local\\Microsoft\\Windows\\Explorer\\thumbcache_sr.db\"",
+    "echo y|reg delete \"HKEY_CLASSES_ROOT\\Local Settings\\Software\\Microsoft\\Windows\\CurrentVersion\\TrayNotify\" /v IconStreams",
+    "echo y|reg delete \"HKEY_CLASSES_ROOT\\Local Settings\\Software\\Microsoft\\Windows\\CurrentVersion\\TrayNotify\" /v PastIconsStream",
+)
+
+
+class PlatformBackend(ABC):
+    """平台相关操作的基类: 文件写入、批量设置文件属性、刷新图标缓存
+    
+    子类必须实现apply_attributes与refresh_icon_cache, 未实现时在创建实例时即报错
+    """
+    
+    def __init__(self):
+        # 待批量应用的属性修改 [(路径, ('+s', '+h')), ...]
+        self.pending_attributes: List[Tuple[str, Tuple[str, ...]]] = []
+    
+    def makedirs(self, path: str) -> bool:
+        """创建目录, 返回是否新建 (已存在时返回False)"""
+        try:
+            os.mkdir(path)
+        except FileExistsError:
+            if not os.path.isdir(path):
+                raise
+            return False
+        except FileNotFoundError:
+            # 上级目录不存在时逐级创建
+            os.makedirs(path)
+        return True
+    
+    def remove_file(self, path: str) -> None:
+        _remove_if_exists(path)
+    
+    def copy_file(self, src: str, dest: str) -> bool:
+        """复制文件, 文件系统支持时创建硬链接, 返回是否为硬链接"""
+        _remove_if_exists(dest)
+        try:
+            os.link(src, dest)
+            return True
+        except OSError:
+            # 跨卷、文件系统不支持硬链接或链接数达到上限(NTFS为1023)
+            import shutil
+            shutil.copy(src, dest)
+            return False
+    
+    def write_text(self, path: str, content: str, encoding: str = INI_ENCODING) -> None:
+        _remove_if_exists(path)
+        with open(path, 'w', encoding=encoding) as f:
+            f.write(content)
+    
+    def queue_attributes(self, path: str, flags: Tuple[str, ...]) -> None:
+        """登记属性修改, 在flush时统一应用"""
+        self.pending_attributes.append((path, tuple(flags)))
+    
+    @abstractmethod
+    def apply_attributes(self, batch: List[Tuple[str, Tuple[str, ...]]]) -> None:
+        """批量应用属性修改"""
+    
+    @abstractmethod
+    def refresh_icon_cache(self) -> None:
+        """刷新系统图标缓存"""
+    
+    def flush(self) -> int:
+        """应用所有待处理的属性修改, 返回修改数量"""
+        batch, self.pending_attributes = self.pending_attributes, []
+        if batch:
+            self.apply_attributes(batch)
+        return len(batch)
+
+
+class WindowsBackend(PlatformBackend):
+    """Windows平台: 直接调用Win32 API设置属性, 不再逐个启动attrib进程"""
+    
+    ATTRIBUTE_FLAGS = {'r': 0x1, 'h': 0x2, 's': 0x4}
+    INVALID_FILE_ATTRIBUTES = 0xFFFFFFFF
+    
+    def __init__(self):
+        super().__init__()
+        import ctypes
+        self._kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+        self._kernel32.GetFileAttributesW.restype = ctypes.c_uint32
+        self._ctypes = ctypes
+    
+    def apply_attributes(self, batch):
+        for path, flags in batch:
+            attrs = self._kernel32.GetFileAttributesW(path)
+            if attrs == self.INVALID_FILE_ATTRIBUTES:
+                logger.error("设置属性失败 %s: %s", path, self._ctypes.WinError(self._ctypes.get_last_error()))
+                continue
+            for flag in flags:
+                bit = self.ATTRIBUTE_FLAGS[flag[1].lower()]
+                attrs = attrs | bit if flag[0] == '+' else attrs & ~bit
+            if not self._kernel32.SetFileAttributesW(path, attrs):
+                logger.error("设置属性失败 %s: %s", path, self._ctypes.WinError(self._ctypes.get_last_error()))
+    
+    def refresh_icon_cache(self):
+        import subprocess
+        subprocess.run(' & '.join(EXPLORER_CACHE_FLUSH_COMMANDS), shell=True)
+
+
+class RecordingBackend(PlatformBackend):
+    """非Windows平台或测试用: 正常写入文件, 仅记录属性修改与缓存刷新"""
+    
+    def __init__(self):
+        super().__init__()
+        self.applied_attributes: List[Tuple[str, Tuple[str, ...]]] = []
+        self.cache_refreshes = 0
+    
+    def apply_attributes(self, batch):
+        self.applied_attributes.extend(batch)
+    
+    def refresh_icon_cache(self):
+        self.cache_refreshes += 1
+
+
+def get_platform_backend() -> PlatformBackend:
+    """返回当前平台对应的后端"""
+    if os.name == 'nt':
+        return WindowsBackend()
+    return RecordingBackend()
+
+
+def _group_plan(plan: List[PlanOp]) -> Tuple[List[List[PlanOp]], List[Optional[int]], bool]:
+    """将计划按节点分组 (每组以mkdir开头), 返回 (分组, 父分组下标, 是否需要刷新图标缓存)"""
+    groups: List[List[PlanOp]] = []
+    parents: List[Optional[int]] = []
+    index: Dict[str, int] = {}
+    refresh_icons = False
+    for op in plan:
+        if op.kind == 'refresh':
+            refresh_icons = True
+        elif op.kind == 'mkdir':
+            # 父节点取计划中最近的祖先目录 (增量计划中未变化的目录不在计划内)
+            parent = None
+            path = os.path.dirname(op.path)
+            while path and parent is None:
+                parent = index.get(path)
+                up = os.path.dirname(path)
+                path = up if up != path else None
+            index[op.path] = len(groups)
+            groups.append([op])
+            parents.append(parent)
+        elif groups:
+            groups[-1].append(op)
+    return groups, parents, refresh_icons
+
+
+def _run_node_ops(ops: List[PlanOp], icon_cache: IconCache, backend: PlatformBackend,
+                  stats: RunStats) -> Optional[str]:
+    """执行单个节点的操作, 返回失败的阶段 ('mkdir' / 'icon'), 成功时返回None"""
+    mkdir_op = ops[0]
+    try:
+        with stats.timer('mkdir'):
+            created = backend.makedirs(mkdir_op.path)
+    except Exception as e:
+        logger.error("创建目录失败 %s: %s", mkdir_op.path, e)
+        stats.incr('folders_failed')
+        return 'mkdir'
+    stats.incr('folders_created' if created else 'folders_existing')
+    logger.debug("目录 %s (%s)", mkdir_op.path, '新建' if created else '已存在')
+    
+    for op in ops[1:]:
+        try:
+            if op.kind == 'icon':
+                with stats.timer('icon'):
+                    cached_path, built = icon_cache.fetch(op.arg)
+                    linked = backend.copy_file(cached_path, op.path)
+                if built:
+                    stats.record_build(op.arg, icon_cache.build_times[op.arg])
+                else:
+                    stats.incr('icon_cache_hits')
+                stats.incr('icons_copied')
+                if linked:
+                    stats.incr('icons_linked')
+            elif op.kind == 'ini':
+                with stats.timer('ini'):
+                    backend.write_text(op.path, op.arg)
+                stats.incr('ini_written')
+            elif op.kind == 'remove':
+                with stats.timer('icon'):
+                    backend.remove_file(op.path)
+                stats.incr('files_removed')
+            elif op.kind == 'attrib':
+                backend.queue_attributes(op.path, op.arg)
+        except Exception as e:
+            # 图标设置失败时跳过该节点余下的操作
+            logger.error("设置图标失败 %s: %s", op.path, e)
+            stats.incr('folders_failed')
+            return 'icon'
+    return None
+
+
+def execute_plan(plan: List[PlanOp], icon_cache: Optional[IconCache] = None,
+                 backend: Optional[PlatformBackend] = None, jobs: int = 1,
+                 progress: Optional[Callable[[int, int], None]] = None,
+                 cancel: Optional[threading.Event] = None,
+                 stats: Optional[RunStats] = None,
+                 completed: Optional[Callable[[str], None]] = None,
+                 refresh: bool = True) -> List[str]:
+    """执行创建计划, 返回处理失败或未执行的目录列表
+    
+    jobs大于1时在线程池中并发创建兄弟子树, 父目录总是先于子目录完成;
+    progress以(已完成目录数, 目录总数)回调进度; cancel被设置后不再开始新的目录;
+    completed在每个目录的操作全部成功后以目录路径回调; refresh为False时由调用方刷新图标缓存
+    """
+    if icon_cache is None:
+        icon_cache = IconCache()
+    if backend is None:
+        backend = get_platform_backend()
+    if stats is None:
+        stats = RunStats()
+    groups, parents, refresh_icons = _group_plan(plan)
+    children: List[List[int]] = [[] for _ in groups]
+    roots = []
+    for i, parent in enumerate(parents):
+        if parent is None:
+            roots.append(i)
+        else:
+            children[parent].append(i)
+    
+    total = len(groups)
+    executed = [False] * total
+    failed_dirs = []
+    finished = 0
+    
+    def on_finished(i: int, result: Optional[str]) -> None:
+        nonlocal finished
+        executed[i] = True
+        if result is not None:
+            failed_dirs.append(groups[i][0].path)
+        elif completed is not None:
+            completed(groups[i][0].path)
+        finished += 1
+        if progress is not None:
+            progress(finished, total)
+    
+    if jobs <= 1:
+        # 串行执行: 按计划顺序, 父目录未成功创建的节点不再执行
+        created = [False] * total
+        for i, ops in enumerate(groups):
+            if cancel is not None and cancel.is_set():
+                break
+            if parents[i] is not None and not created[parents[i]]:
+                continue
+            result = _run_node_ops(ops, icon_cache, backend, stats)
+            created[i] = result != 'mkdir'
+            on_finished(i, result)
+    else:
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            running = {pool.submit(_run_node_ops, groups[i], icon_cache, backend, stats): i for i in roots}
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i = running.pop(future)
+                    if future.cancelled():
+                        continue
+                    result = future.result()
+                    on_finished(i, result)
+                    # 目录创建成功后才提交其子节点
+                    if result != 'mkdir' and not (cancel is not None and cancel.is_set()):
+                        for child in children[i]:
+                            running[pool.submit(_run_node_ops, groups[child], icon_cache, backend, stats)] = child
+                if cancel is not None and cancel.is_set():
+                    for future in running:
+                        future.cancel()
+    
+    # 取消或因父目录失败而未执行的节点同样视为失败, 不写入清单
+    not_executed = [groups[i][0].path for i in range(total) if not executed[i]]
+    failed_dirs.extend(not_executed)
+    stats.incr('folders_not_run', len(not_executed))
+    
+    # 属性修改批量应用, 图标缓存在整个运行结束时只刷新一次
+    with stats.timer('attrib'):
+        stats.incr('attrib_calls', backend.flush())
+    if refresh_icons and refresh:
+        with stats.timer('cache_flush'):
+            backend.refresh_icon_cache()
+        stats.incr('cache_flushes')
+    stats.failed.extend(failed_dirs)
+    return failed_dirs
+
+
+def create_folders(base_path: str, folders: Union[Dict, NodeStore], icon_cache: Optional[IconCache] = None,
+                   backend: Optional[PlatformBackend] = None, incremental: bool = True,
+                   jobs: int = 1, progress: Optional[Callable[[int, int], None]] = None,
+                   cancel: Optional[threading.Event] = None, dry_run: bool = False,
+                   stats: Optional[RunStats] = None, report_path: Optional[str] = None,
+                   resume: bool = False, states: Optional[List[NodeState]] = None,
+                   refresh: bool = True, validate: bool = True,
+                   icon_progress: Optional[Callable[[int, int], None]] = None) -> RunStats:
+    """根据配置创建目录结构并设置图标, 返回本次运行的统计信息
+    
+    incremental为True时只处理与上次应用清单相比发生变化的目录, jobs为并发线程数;
+    dry_run为True时只生成计划, 不修改文件系统; report_path指定时写出JSON运行报告;
+    resume为True时跳过上次中断前已完成的目录; states与refresh见compile_plan和execute_plan;
+    validate为True时先检查配置, 有问题时在修改任何文件之前抛出PreflightError;
+    icon_progress以(已处理图片数, 图片总数)回调生成ico阶段的进度;
+    cancel在生成计划或ico阶段被设置时直接返回, 不修改任何目录
+    """
+    if icon_cache is None:
+        icon_cache = IconCache()
+    if stats is None:
+        stats = RunStats()
+    
+    if validate:
+        with stats.timer('validate'):
+            problems = validate_config(folders, base_path)
+        if problems:
+            raise PreflightError(problems)
+    
+    journal = Journal(base_path)
+    with stats.timer('plan'):
+        manifest = Manifest.load(base_path) if incremental else Manifest(base_path)
+        plan = compile_plan(base_path, folders, manifest, icon_cache, states, cancel)
+        if cancel is not None and cancel.is_set():
+            logger.info("应用已在生成计划时取消 %s", os.path.abspath(base_path))
+            return stats
+        if resume:
+            plan, resumed = _resume_plan(plan, manifest, journal.load())
+            stats.incr('folders_resumed', resumed)
+    for op in plan:
+        stats.operations[op.kind] = stats.operations.get(op.kind, 0) + 1
+    stats.incr('nodes', len(manifest.nodes))
+    # 与上次应用相比没有变化的目录 (断点续传跳过的目录仍保留mkdir操作, 计入folders_resumed)
+    stats.incr('folders_skipped', len(manifest.nodes) - stats.operations.get('mkdir', 0))
+    
+    # 在修改任何目录之前为每个源图片生成一次ico, 有图片无法处理时直接中止
+    sources = sorted({op.arg for op in plan if op.kind == 'icon'})
+    with stats.timer('icon_build'):
+        problems = icon_cache.prepare(sources, jobs, build=not dry_run, stats=stats,
+                                      progress=icon_progress, cancel=cancel)
+    if problems:
+        raise PreflightError(problems)
+    if cancel is not None and cancel.is_set():
+        logger.info("应用已在生成图标时取消 %s", os.path.abspath(base_path))
+        return stats
+    
+    if not dry_run:
+        def record(folder_path: str) -> None:
+            key = manifest.key(folder_path)
+            journal.record(key, Journal.state_digest(manifest.nodes.get(key)))
+        
+        journal.open(append=resume)
+        try:
+            failed_dirs = execute_plan(plan, icon_cache, backend, jobs, progress, cancel, stats, record, refresh)
+        finally:
+            journal.close()
+        manifest.discard(failed_dirs)
+        manifest.save()
+        # 全部成功后不再需要断点记录
+        if not failed_dirs:
+            journal.remove()
+    
+    logger.info("应用完成 %s: %s", os.path.abspath(base_path), stats.counters)
+    if report_path:
+        stats.write_report(report_path)
+    return stats
+
+
+def apply_to_targets(base_paths: List[str], folders: Union[Dict, NodeStore],
+                     icon_cache: Optional[IconCache] = None, incremental: bool = True,
+                     jobs: int = 1, target_jobs: int = DEFAULT_JOBS, dry_run: bool = False,
+                     resume: bool = False) -> Dict[str, RunStats]:
+    """将同一配置并发应用到多个目标目录, 返回 目标目录 -> 统计信息 (timings中含total)
+    
+    各目标共用一次编译的节点状态与同一组转换后的ico文件, 每个目标使用jobs个线程,
+    最多同时处理target_jobs个目标, 图标缓存在全部完成后只刷新一次;
+    有源图片无法处理时在修改任何目标之前抛出PreflightError
+    """
+    if icon_cache is None:
+        icon_cache = IconCache()
+    base_paths = list(dict.fromkeys(os.path.abspath(path) for path in base_paths))
+    # 只有路径长度与目标目录有关, 按最长的目标目录检查一次即可
+    problems = validate_config(folders, max(base_paths, key=len)) if base_paths else []
+    if problems:
+        raise PreflightError(problems)
+    states = list(compile_states(folders, icon_cache))
+    sources = sorted({icon_path for _, _, icon_path in states if icon_path})
+    problems = icon_cache.prepare(sources, max(jobs, target_jobs), build=not dry_run)
+    if problems:
+        raise PreflightError(problems)
+    results = {path: RunStats() for path in base_paths}
+    
+    def apply(base_path: str) -> None:
+        stats = results[base_path]
+        start = time.perf_counter()
+        try:
+            create_folders(base_path, folders, icon_cache, get_platform_backend(), incremental,
+                           jobs, dry_run=dry_run, stats=stats, resume=resume, states=states,
+                           refresh=False, validate=False)
+        except Exception as e:
+            # 单个目标失败(如无法写入清单)不影响其他目标
+            logger.error("应用到 %s 失败: %s", base_path, e)
+            stats.failed.append(base_path)
+        stats.add_time('total', time.perf_counter() - start)
+    
+    with ThreadPoolExecutor(max_workers=max(1, target_jobs)) as pool:
+        list(pool.map(apply, base_paths))
+    
+    if not dry_run and any(stats.operations.get('refresh') for stats in results.values()):
+        get_platform_backend().refresh_icon_cache()
+    return results
+
+
+# 导入目录时可映射为_icon的图标文件类型
+IMPORTABLE_ICON_EXTENSIONS = ('.ico', '.png')
+
+
+def _read_icon_resource(folder_path: str) -> Optional[str]:
+    """读取目录中desktop.ini的IconResource/IconFile, 返回图标文件路径"""
+    try:
+        with open(os.path.join(folder_path, 'desktop.ini'), 'rb') as f:
+            raw = f.read()
+    except OSError:
+        return None
+    if raw.startswith((b'\xff\xfe', b'\xfe\xff')):
+        text = raw.decode('utf-16', errors='replace')
+    else:
+        text = raw.decode(INI_ENCODING, errors='replace')
+    
+    for line in text.splitlines():
+        key, sep, value = line.partition('=')
+        if sep and key.strip().lower() in ('iconresource', 'iconfile'):
+            # 去掉图标索引 ",0"
+            resource = value.strip().rsplit(',', 1)[0].strip().strip('"')
+            if not resource:
+                continue
+            # 只导入图标或图片文件, DLL/EXE中的图标资源无法作为_icon使用
+            if os.path.splitext(resource)[1].lower() not in IMPORTABLE_ICON_EXTENSIONS:
+                logger.warning("跳过不支持的图标资源 %s: %s", folder_path, resource)
+                return None
+            resource = os.path.expandvars(resource.replace('\\', os.sep))
+            return os.path.normpath(os.path.join(folder_path, resource))
+    return None
+
+
+def _map_imported_icon(icon_file: str, icon_dir: str = '图标') -> str:
+    """将目录中的图标映射回配置的_icon: 图标目录中有同名图片时使用该图片, 否则使用图标文件本身"""
+    stem = os.path.splitext(os.path.basename(icon_file))[0]
+    for ext in ('.png', '.ico'):
+        candidate = os.path.join(icon_dir, stem + ext)
+        if os.path.exists(candidate):
+            return candidate.replace(os.sep, '/')
+    return os.path.abspath(icon_file)
+
+
+def _scan_directory(path: str, list_children: bool, exclude: Tuple[str, ...],
+                    rel_prefix: str) -> Tuple[List[Tuple[str, str]], Optional[str]]:
+    """扫描单个目录, 返回 (子目录[(名称, 路径)], 图标文件路径)"""
+    subdirs = []
+    has_ini = False
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                name = entry.name
+                if name.lower() == 'desktop.ini':
+                    has_ini = True
+                    continue
+                if not list_children:
+                    continue
+                try:
+                    # 不跟随符号链接, 避免循环
+                    if not entry.is_dir(follow_symlinks=False):
+                        continue
+                except OSError:
+                    continue
+                rel = rel_prefix + name
+                if any(fnmatch.fnmatch(name, pat) or fnmatch.fnmatch(rel, pat) for pat in exclude):
+                    continue
+                subdirs.append((name, entry.path))
+    except OSError as e:
+        logger.warning("无法读取目录 %s: %s", path, e)
+    subdirs.sort()
+    icon_file = _read_icon_resource(path) if has_ini else None
+    return subdirs, icon_file
+
+
+def _unrepresentable_name(name: str) -> bool:
+    """目录名在配置中会被当作元数据键或模板, 无法原样导入"""
+    return name.startswith('_') or NAME_RANGE_PATTERN.search(name) is not None
+
+
+def import_folder_tree(root_path: str, max_depth: Optional[int] = None,
+                       exclude: Tuple[str, ...] = (), jobs: int = DEFAULT_JOBS,
+                       skipped: Optional[List[str]] = None) -> Dict:
+    """在线程池中遍历已有目录树, 生成与_load_config_file相同格式的配置
+    
+    max_depth限制导入的层数 (1表示只导入第一层), exclude为按名称或相对路径匹配的排除模式;
+    desktop.ini中的IconResource会映射回_icon; 以下划线开头或含 {a..b} 的目录名在配置中
+    有特殊含义, 这些目录及其子目录会被跳过, 其相对路径追加到skipped中
+    """
+    root_path = os.path.abspath(root_path)
+    exclude = tuple(exclude)
+    jobs = max(1, jobs)
+    folders: Dict = {}
+    
+    def scan_batch(batch):
+        return [
+            _scan_directory(path, max_depth is None or depth < max_depth, exclude, rel_prefix)
+            for _, depth, path, rel_prefix in batch
+        ]
+    
+    # 待扫描的目录: (目录字典, 深度, 路径, 相对路径前缀)
+    pending = [(folders, 0, root_path, '')]
+    running = {}
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        while pending or running:
+            # 每个任务扫描一批目录, 减少大量小目录时的调度开销
+            while pending and len(running) < jobs * 2:
+                size = max(1, min(IMPORT_BATCH_SIZE, len(pending) // jobs))
+                batch = pending[-size:]
+                del pending[-size:]
+                running[pool.submit(scan_batch, batch)] = batch
+            
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                batch = running.pop(future)
+                for (content, depth, _, rel_prefix), (subdirs, icon_file) in zip(batch, future.result()):
+                    if icon_file and depth > 0:
+                        content['_icon'] = _map_imported_icon(icon_file)
+                    for name, path in subdirs:
+                        if _unrepresentable_name(name):
+                            logger.warning("跳过无法写入配置的目录: %s", path)
+                            if skipped is not None:
+                                skipped.append(rel_prefix + name)
+                            continue
+                        child: Dict = {}
+                        content[name] = child
+                        pending.append((child, depth + 1, path, rel_prefix + name + '/'))
+    return {'folders': folders}
+
+
+def _positive_int(value: str) -> int:
+    """argparse参数类型: 不小于1的整数"""
+    import argparse
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"必须不小于1: {value}")
+    return number
+
+
+def run_apply_cli(argv: List[str]) -> int:
+    """命令行模式: 不启动图形界面, 直接应用配置文件"""
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog='main.py apply',
+        description="将配置文件中的目录结构与图标应用到目标目录, 最后一行输出JSON格式的统计信息"
+    )
+    parser.add_argument('config', help="配置文件(.json)")
+    parser.add_argument('--target', action='append', dest='targets', default=[],
+                        help="目标目录, 可多次指定以并发应用到多个目录 (默认为当前目录)")
+    parser.add_argument('--jobs', type=int, default=DEFAULT_JOBS, help="并发线程数")
+    parser.add_argument('--target-jobs', type=int, default=DEFAULT_JOBS, help="同时处理的目标目录数")
+    parser.add_argument('--dry-run', action='store_true', help="只生成计划, 不修改文件系统")
+    parser.add_argument('--full', action='store_true', help="忽略上次应用的清单, 处理所有目录")
+    parser.add_argument('--resume', action='store_true', help="跳过上次中断前已完成的目录")
+    parser.add_argument('--report', help="将统计信息写入指定的JSON文件")
+    parser.add_argument('-v', '--verbose', action='count', default=0, help="输出更多日志 (-vv 输出每个目录)")
+    args = parser.parse_args(argv)
+    
+    level = (logging.WARNING, logging.INFO, logging.DEBUG)[min(args.verbose, 2)]
+    logging.basicConfig(level=level, format='%(levelname)s %(message)s', stream=sys.stderr)
+    
+    stats = RunStats()
+    start = time.perf_counter()
+    try:
+        with stats.timer('parse'):
+            # 解析时直接合并相同子树, 大型配置不必先生成完整的字典树
+            folders = NodeStore.load(args.config)
+    except (OSError, ValueError) as e:
+        logger.error("无法加载配置文件 %s: %s", args.config, e)
+        return 2
+    
+    targets = args.targets or ['.']
+    try:
+        if len(targets) == 1:
+            create_folders(targets[0], folders, incremental=not args.full, jobs=args.jobs,
+                           dry_run=args.dry_run, stats=stats, resume=args.resume)
+        else:
+            results = apply_to_targets(targets, folders, incremental=not args.full, jobs=args.jobs,
+                                       target_jobs=args.target_jobs, dry_run=args.dry_run,
+                                       resume=args.resume)
+    except PreflightError as e:
+        for problem in e.problems:
+            logger.error("%s", problem)
+        return 2
+    
+    if len(targets) == 1:
+        summary = stats.to_dict()
+        summary['timings']['total'] = round(time.perf_counter() - start, 6)
+        summary.update(config=args.config, target=os.path.abspath(targets[0]), dry_run=args.dry_run)
+        failed = bool(stats.failed)
+    else:
+        summary = {
+            'targets': {path: result.to_dict() for path, result in results.items()},
+            'timings': {'parse': round(stats.timings['parse'], 6),
+                        'total': round(time.perf_counter() - start, 6)},
+            'config': args.config,
+            'dry_run': args.dry_run,
+        }
+        failed = any(result.failed for result in results.values())
+    if args.report:
+        write_json_atomic(args.report, summary, indent=2)
+    print(json.dumps(summary, ensure_ascii=False))
+    return 1 if failed else 0
 
-                with open(desktop_ini_path, 'w', encoding='ANSI') as f:
-                    f.write(f"[.ShellClassInfo]\nIconResource=.\{icon_name},0")
-                
-                # 设置desktop.ini为系统和隐藏文件
-                subprocess.run(['attrib', '+s', '+h', desktop_ini_path], shell=True)
-                # 设置icon文件为隐藏文件
-                subprocess.run(['attrib', '+s', '+h', final_icon_path], shell=True)
-                # 设置文件夹为读
-                subprocess.run(['attrib', '+r', folder_path], shell=True)
-
-                # 清除图标缓存
-                os.system("attrib -h -s -r \"%userprofile%\AppData\Local\IconCache.db\"")
-                os.system("del /f \"%userprofile%\AppData\Local\IconCache.db\"")
-                os.system("attrib /s /d -h -s -r \"%userprofile%\AppData\Local\Microsoft\Windows\Explorer\*\"")
-                os.system("del /f \"%userprofile%\AppData\Local\Microsoft\Windows\Explorer\thumbcache_32.db\"")
-                os.system("del /f \"%userprofile%\AppData\Local\Microsoft\Windows\Explorer\thumbcache_96.db\"")
-                os.system("del /f \"%userprofile%\AppData\Local\Microsoft\Windows\Explorer\thumbcache_102.db\"")
-                os.system("del /f \"%userprofile%\AppData\Local\Microsoft\Windows\Explorer\thumbcache_256.db\"")
-                os.system("del /f \"%userprofile%\AppData\Local\Microsoft\Windows\Explorer\thumbcache_1024.db\"")
-                os.system("del /f \"%userprofile%\AppData\Local\Microsoft\Windows\Explorer\thumbcache_idx.db\"")
-                os.system("del /f \"%userprofile%\AppData\Local\Microsoft\Windows\Explorer\thumbcache_sr.db\"")
-                os.system("echo y|reg delete \"HKEY_CLASSES_ROOT\Local Settings\Software\Microsoft\Windows\CurrentVersion\TrayNotify\" /v IconStreams")
-                os.system("echo y|reg delete \"HKEY_CLASSES_ROOT\Local Settings\Software\Microsoft\Windows\CurrentVersion\TrayNotify\" /v PastIconsStream")
-            except Exception as e:
-                print(f"设置图标失败: {str(e)}")
-                
-        # 如果有子目录，递归创建
-        if isinstance(content, dict):
-            subfolders = {k: v for k, v in content.items() if not k.startswith('_')}
-            if subfolders:
-                create_folders(folder_path, subfolders)
 
-def main():
+def run_import_cli(argv: List[str]) -> int:
+    """命令行模式: 将已有目录树导入为配置文件"""
+    import argparse
+    parser = argparse.ArgumentParser(prog='main.py import', description="将已有目录树导入为配置文件")
+    parser.add_argument('source', help="要导入的目录")
+    parser.add_argument('-o', '--output', required=True, help="输出的配置文件(.json)")
+    parser.add_argument('--max-depth', type=int, help="最多导入的层数")
+    parser.add_argument('--exclude', action='append', default=[], help="排除的目录名或相对路径模式, 可多次指定")
+    parser.add_argument('--jobs', type=_positive_int, default=DEFAULT_JOBS, help="并发线程数")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s %(message)s', stream=sys.stderr)
+    
+    if not os.path.isdir(args.source):
+        logger.error("目录不存在: %s", args.source)
+        return 2
+    start = time.perf_counter()
+    skipped: List[str] = []
+    data = import_folder_tree(args.source, args.max_depth, tuple(args.exclude), args.jobs, skipped)
+    elapsed = time.perf_counter() - start
+    write_json_atomic(args.output, data, indent=4)
+    print(json.dumps({
+        'source': os.path.abspath(args.source),
+        'output': args.output,
+        'nodes': sum(1 for _ in iter_folder_nodes(args.source, data['folders'])),
+        'skipped': len(skipped),
+        'seconds': round(elapsed, 6),
+    }, ensure_ascii=False))
+    return 0
+
+
+def run_gui() -> None:
+    """启动配置编辑界面"""
+    init_icon_dir()
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s %(message)s')
+    _load_gui_modules()
     root = tk.Tk()
     # 设置窗口图标
     try:
@@ -559,8 +2846,18 @@ def main():
     root.configure(bg="#f0f0f0")
     
     app = ConfigEditorGUI(root)
+    # 关闭窗口时保存未写入的修改
+    root.protocol("WM_DELETE_WINDOW", app.on_close)
     root.mainloop()
 
+def main(argv: Optional[List[str]] = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == 'apply':
+        return run_apply_cli(argv[1:])
+    if argv and argv[0] == 'import':
+        return run_import_cli(argv[1:])
+    run_gui()
+    return 0
+
 if __name__ == '__main__':
-    init_icon_dir()
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,429 @@
+import json
+import os
+import shutil
+import threading
+
+import pytest
+
+import main
+
+
+class CopyIconCache(main.IconCache):
+    """不依赖PIL的图标缓存, 直接复制源文件作为ico"""
+
+    def build(self, src_path, dest_path):
+        shutil.copyfile(src_path, dest_path)
+
+
+@pytest.fixture
+def icons(tmp_path):
+    """两个内容不同的源图标"""
+    paths = []
+    for name in ('a.png', 'b.png'):
+        path = tmp_path / name
+        path.write_bytes(name.encode() * 16)
+        paths.append(str(path))
+    return paths
+
+
+@pytest.fixture
+def icon_cache(tmp_path):
+    return CopyIconCache(str(tmp_path / 'cache'))
+
+
+def sample_folders(icons):
+    return {
+        '项目': {
+            '_icon': icons[0],
+            '文档': {'_icon': icons[1]},
+            '章节{1..3}': {'图片': {}},
+        },
+        '归档': {'2024': {}, '2025': {'_icon': icons[0]}},
+    }
+
+
+def apply(base_path, folders, icon_cache, backend=None, **kwargs):
+    return main.create_folders(str(base_path), folders, icon_cache,
+                               backend or main.RecordingBackend(), **kwargs)
+
+
+def test_reapply_runs_no_operations(tmp_path, icons, icon_cache):
+    folders = sample_folders(icons)
+    first = apply(tmp_path / 'out', folders, icon_cache)
+    assert first.operations['mkdir'] == 11
+    assert first.counters['icons_copied'] == 3
+
+    backend = main.RecordingBackend()
+    second = apply(tmp_path / 'out', folders, icon_cache, backend)
+    assert second.operations == {}
+    assert second.counters['folders_created'] == 0
+    assert second.counters['folders_skipped'] == 11
+    assert backend.applied_attributes == []
+    assert backend.cache_refreshes == 0
+
+
+def test_unset_icon_removes_files_and_readonly(tmp_path, icons, icon_cache):
+    base = tmp_path / 'out'
+    apply(base, {'a': {'_icon': icons[0]}}, icon_cache)
+    assert (base / 'a' / 'desktop.ini').exists()
+
+    backend = main.RecordingBackend()
+    stats = apply(base, {'a': {}}, icon_cache, backend)
+    assert os.listdir(base / 'a') == []
+    assert stats.counters['files_removed'] == 2
+    assert (str(base / 'a'), ('-r',)) in backend.applied_attributes
+    assert backend.cache_refreshes == 1
+
+
+@pytest.fixture
+def import_source(tmp_path, monkeypatch):
+    """供导入的目录树, 当前目录切换到tmp_path以使用其中的图标目录"""
+    monkeypatch.chdir(tmp_path)
+    src = tmp_path / 'src'
+    for rel in ('a/b/c', 'a/skip', 'node_modules/m', '_build/x', 'a{1..2}', 'dll', 'keep', 'mapped'):
+        (src / rel).mkdir(parents=True)
+    (src / 'keep' / 'icon.ico').write_bytes(b'ico')
+    inis = {'keep': 'icon.ico,0', 'dll': r'%SystemRoot%\system32\shell32.dll,3', 'mapped': 'logo.ico,0'}
+    for rel, resource in inis.items():
+        (src / rel / 'desktop.ini').write_text(f'[.ShellClassInfo]\nIconResource={resource}\n', encoding='utf-8')
+    (tmp_path / '图标').mkdir()
+    (tmp_path / '图标' / 'logo.png').write_bytes(b'png')
+    return src
+
+
+def test_import_folder_tree(import_source):
+    skipped = []
+    data = main.import_folder_tree(str(import_source), exclude=('node_modules', 'a/skip'), skipped=skipped)
+    assert data == {'folders': {
+        'a': {'b': {'c': {}}},
+        'dll': {},
+        'keep': {'_icon': str(import_source / 'keep' / 'icon.ico')},
+        'mapped': {'_icon': '图标/logo.png'},
+    }}
+    assert sorted(skipped) == ['_build', 'a{1..2}']
+
+
+def test_import_folder_tree_max_depth_and_jobs(import_source):
+    shallow = main.import_folder_tree(str(import_source), max_depth=1, exclude=('node_modules',))
+    assert shallow['folders']['a'] == {}
+    assert shallow['folders']['mapped'] == {'_icon': '图标/logo.png'}
+    # jobs小于1时按单线程处理
+    assert main.import_folder_tree(str(import_source), jobs=0) == main.import_folder_tree(str(import_source), jobs=1)
+
+
+def test_run_import_cli_exit_codes(import_source, capsys):
+    assert main.run_import_cli([str(import_source), '-o', 'out.json']) == 0
+    summary = json.loads(capsys.readouterr().out)
+    assert summary['skipped'] == 2
+    with open('out.json', encoding='utf-8') as f:
+        assert 'keep' in json.load(f)['folders']
+    assert main.run_import_cli([str(import_source / 'missing'), '-o', 'out.json']) == 2
+    with pytest.raises(SystemExit) as exc:
+        main.run_import_cli([str(import_source), '-o', 'out.json', '--jobs', '0'])
+    assert exc.value.code == 2
+
+
+def test_node_store_load_matches_dict(tmp_path, icons, icon_cache):
+    folders = sample_folders(icons)
+    folders['归档']['2026'] = folders['归档']['2024']
+    folders['_comment'] = {'note': '元数据'}
+    path = tmp_path / 'config.json'
+    path.write_text(json.dumps({'folders': folders}, ensure_ascii=False), encoding='utf-8')
+
+    store = main.NodeStore.load(str(path))
+    assert store.to_dict() == folders
+    assert store.count() == main.NodeStore.from_dict(folders).count() == 12
+    assert list(main.compile_states(store, icon_cache)) == list(main.compile_states(folders, icon_cache))
+
+
+@pytest.mark.parametrize('text', [
+    # 相等但类型不同的元数据值不能合并为同一节点
+    '{"folders": {"a": {"_flag": 1, "x": {}}, "b": {"_flag": true, "x": {}}, "c": {"_flag": 1.0, "x": {}},'
+    ' "d": {"_flag": "{\\"k\\": 1}"}, "e": {"_flag": {"k": 1}}}}',
+    # 重复的键与json.load一致只保留最后一个
+    '{"folders": {"a": {}, "b": {"_icon": "x.png", "_icon": "y.png"}, "a": {"b": {}}}}',
+])
+def test_node_store_load_matches_json_load(tmp_path, text):
+    path = tmp_path / 'config.json'
+    path.write_text(text, encoding='utf-8')
+    expected = json.loads(text)['folders']
+    result = main.NodeStore.load(str(path)).to_dict()
+    assert result == expected
+    assert [(k, type(v.get('_flag'))) for k, v in result.items()] == \
+        [(k, type(v.get('_flag'))) for k, v in expected.items()]
+    assert main.validate_config(main.NodeStore.load(str(path)), str(tmp_path), check_icons=False) == []
+
+
+class FailingBackend(main.RecordingBackend):
+    """名称为bad的目录创建失败"""
+
+    def makedirs(self, path):
+        if os.path.basename(path) == 'bad':
+            raise PermissionError(path)
+        return super().makedirs(path)
+
+
+@pytest.mark.parametrize('jobs', [1, 4])
+def test_not_run_folders_are_counted_separately(tmp_path, icon_cache, jobs):
+    folders = {'ok': {}, 'bad': {'x': {'y': {}}, 'z': {}}}
+    stats = apply(tmp_path / 'out', folders, icon_cache, FailingBackend(), jobs=jobs)
+    assert stats.counters['folders_failed'] == 1
+    assert stats.counters['folders_not_run'] == 3
+    assert stats.counters['folders_skipped'] == 0
+    assert len(stats.failed) == 4
+
+    again = apply(tmp_path / 'out', folders, icon_cache, jobs=jobs)
+    assert again.counters['folders_skipped'] == 1
+    assert again.counters['folders_created'] == 4
+    assert again.counters['folders_not_run'] == 0
+
+
+def test_incomplete_backend_fails_on_creation():
+    class NoRefreshBackend(main.PlatformBackend):
+        def apply_attributes(self, batch):
+            pass
+
+    with pytest.raises(TypeError):
+        NoRefreshBackend()
+    assert isinstance(main.get_platform_backend(), main.PlatformBackend)
+
+
+def snapshot(base_path):
+    """返回 相对路径 -> 文件内容 (目录为None), 不含清单与断点记录"""
+    result = {}
+    for dirpath, dirnames, filenames in os.walk(base_path):
+        for name in dirnames:
+            result[os.path.relpath(os.path.join(dirpath, name), base_path)] = None
+        for name in filenames:
+            if name in (main.Manifest.FILENAME, main.Journal.FILENAME):
+                continue
+            path = os.path.join(dirpath, name)
+            with open(path, 'rb') as f:
+                result[os.path.relpath(path, base_path)] = f.read()
+    return result
+
+
+def test_serial_and_parallel_produce_same_tree(tmp_path, icons, icon_cache):
+    folders = sample_folders(icons)
+    serial = main.RecordingBackend()
+    parallel = main.RecordingBackend()
+    apply(tmp_path / 'serial', folders, icon_cache, serial, jobs=1)
+    apply(tmp_path / 'parallel', folders, icon_cache, parallel, jobs=4)
+    assert snapshot(tmp_path / 'serial') == snapshot(tmp_path / 'parallel')
+
+    def relative(backend, base):
+        return sorted((os.path.relpath(path, base), flags) for path, flags in backend.applied_attributes)
+    assert relative(serial, tmp_path / 'serial') == relative(parallel, tmp_path / 'parallel')
+
+
+def test_background_writer_coalesces_pending_writes(tmp_path, monkeypatch):
+    writes = []
+    started = threading.Event()
+    release = threading.Event()
+    write_json_atomic = main.write_json_atomic
+
+    def slow_write(path, data, **kwargs):
+        writes.append((os.path.basename(path), data))
+        started.set()
+        release.wait(5)
+        if data == 'fail':
+            raise OSError('磁盘已满')
+        write_json_atomic(path, data, **kwargs)
+
+    monkeypatch.setattr(main, 'write_json_atomic', slow_write)
+    writer = main.BackgroundJsonWriter(indent=4)
+    a, b = str(tmp_path / 'a.json'), str(tmp_path / 'b.json')
+    writer.submit(a, 1)
+    assert started.wait(5)
+    # 第一次写入进行中, 同一文件之后的多次提交只写入最新内容
+    for data in (2, 3, 4):
+        writer.submit(a, data)
+    writer.submit(b, 'fail')
+    assert writer.busy
+    release.set()
+    writer.close()
+
+    assert writes == [('a.json', 1), ('a.json', 4), ('b.json', 'fail')]
+    with open(a, encoding='utf-8') as f:
+        assert json.load(f) == 4
+    path, error = writer.errors.get_nowait()
+    assert path == b and isinstance(error, OSError)
+
+
+def test_run_apply_cli_exit_codes(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'ok.json').write_text(json.dumps({'folders': {'a': {'b': {}}, 'bad': {'c': {}}}}), encoding='utf-8')
+    (tmp_path / 'invalid.json').write_text('{"folders": ', encoding='utf-8')
+    (tmp_path / 'reserved.json').write_text(json.dumps({'folders': {'CON': {}}}), encoding='utf-8')
+
+    assert main.run_apply_cli(['missing.json']) == 2
+    assert main.run_apply_cli(['invalid.json']) == 2
+    assert main.run_apply_cli(['reserved.json', '--target', 'out']) == 2
+    assert not (tmp_path / 'out').exists()
+    capsys.readouterr()
+
+    assert main.run_apply_cli(['ok.json', '--target', 'out', '--dry-run']) == 0
+    assert not (tmp_path / 'out' / 'a').exists()
+    assert main.run_apply_cli(['ok.json', '--target', 'out']) == 0
+    summary = json.loads(capsys.readouterr().out.splitlines()[-1])
+    assert summary['counters']['folders_created'] == 4
+
+    # 有目录失败时返回1, 多目标时按任一目标失败判断
+    monkeypatch.setattr(main, 'get_platform_backend', FailingBackend)
+    assert main.run_apply_cli(['ok.json', '--target', 'failing', '--full']) == 1
+    assert main.run_apply_cli(['ok.json', '--target', 'm1', '--target', 'm2']) == 1
+
+
+class InterruptingBackend(main.RecordingBackend):
+    """创建到第limit个目录时模拟进程中断"""
+
+    def __init__(self, limit):
+        super().__init__()
+        self.limit = limit
+        self.calls = 0
+
+    def makedirs(self, path):
+        self.calls += 1
+        if self.calls == self.limit:
+            raise KeyboardInterrupt
+        return super().makedirs(path)
+
+
+def test_resume_after_interrupted_run(tmp_path, icons, icon_cache):
+    folders = sample_folders(icons)
+    base = tmp_path / 'out'
+    with pytest.raises(KeyboardInterrupt):
+        apply(base, folders, icon_cache, InterruptingBackend(limit=6))
+    with open(base / main.Journal.FILENAME, encoding='utf-8') as f:
+        assert len(f.read().splitlines()) == 5
+
+    stats = apply(base, folders, icon_cache, resume=True)
+    assert stats.counters['folders_resumed'] == 5
+    assert stats.counters['folders_created'] == 6
+    assert stats.counters['folders_skipped'] == 0
+    assert not (base / main.Journal.FILENAME).exists()
+
+    apply(tmp_path / 'clean', folders, icon_cache)
+    assert snapshot(base) == snapshot(tmp_path / 'clean')
+
+
+def test_apply_to_targets_counts_per_root_and_refreshes_once(tmp_path, icons, icon_cache, monkeypatch):
+    backends = []
+
+    def make_backend():
+        backends.append(main.RecordingBackend())
+        return backends[-1]
+
+    monkeypatch.setattr(main, 'get_platform_backend', make_backend)
+    folders = sample_folders(icons)
+    targets = [str(tmp_path / name) for name in ('t1', 't2', 't3')]
+    results = main.apply_to_targets(targets, folders, icon_cache, jobs=2, target_jobs=3)
+
+    assert sorted(results) == targets
+    for stats in results.values():
+        assert stats.counters['folders_created'] == 11
+        assert stats.counters['icons_copied'] == 3
+        # ico在应用到各目标之前统一生成, 各目标只计命中
+        assert stats.counters['icon_cache_hits'] == 3
+        assert stats.counters['icons_converted'] == 0
+        assert stats.failed == []
+    assert icon_cache.misses == 2
+    assert sum(backend.cache_refreshes for backend in backends) == 1
+    assert snapshot(targets[0]) == snapshot(targets[1]) == snapshot(targets[2])
+
+    backends.clear()
+    again = main.apply_to_targets(targets, folders, icon_cache)
+    assert all(stats.operations == {} for stats in again.values())
+    assert sum(backend.cache_refreshes for backend in backends) == 0
+
+
+def test_config_catalog_scan_detects_stale_entries(tmp_path):
+    (tmp_path / 'a.json').write_text(json.dumps({'folders': {'x': {'y': {}}}}), encoding='utf-8')
+    (tmp_path / 'broken.json').write_text('{', encoding='utf-8')
+    (tmp_path / 'notes.txt').write_text('', encoding='utf-8')
+    catalog = main.ConfigCatalog(str(tmp_path))
+    names, stale = catalog.scan()
+    assert names == ['a.json', 'broken.json'] and sorted(stale) == names
+    for name in ('a.json', 'broken.json'):
+        catalog.update(name, catalog.summarize(name))
+    assert catalog.entries['a.json']['nodes'] == 2
+    assert 'error' in catalog.entries['broken.json']
+    catalog.save()
+
+    # 重新打开时只按修改时间与大小判断, 未变化的文件(包括解析失败的)不再统计
+    catalog = main.ConfigCatalog(str(tmp_path))
+    assert catalog.scan() == (['a.json', 'broken.json'], [])
+
+    path = tmp_path / 'a.json'
+    path.write_text(json.dumps({'folders': {'x': {}}}), encoding='utf-8')
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    (tmp_path / 'broken.json').unlink()
+    (tmp_path / 'new.json').write_text('{}', encoding='utf-8')
+    names, stale = catalog.scan()
+    assert names == ['a.json', 'new.json'] and sorted(stale) == names
+    assert 'broken.json' not in catalog.entries
+    assert 'nodes' not in catalog.entries['a.json']
+
+
+def test_folder_index_follows_model_changes():
+    model = main.FolderModel({
+        '项目': {'_icon': '图标/项目.png', '文档': {}, '图片': {}},
+        '归档': {'旧文档': {}},
+    })
+    index = main.FolderIndex(model)
+
+    def names(query):
+        return ['/'.join(node.path()) for node in index.search(query)]
+
+    # 以查询开头的名称排在前面
+    assert names('文档') == ['项目/文档', '归档/旧文档']
+    assert names('项目/图') == ['项目/图片']
+    assert names('icon:项目') == ['项目']
+
+    project = model.root.children['项目']
+    added = model.add_child(project, '文档草稿')
+    model.set_icon(added, '图标/草稿.png')
+    assert names('文档') == ['项目/文档', '项目/文档草稿', '归档/旧文档']
+    assert names('icon:草稿') == ['项目/文档草稿']
+
+    model.set_icon(project, None)
+    assert names('icon:项目') == []
+    model.remove(project)
+    assert names('文档') == ['归档/旧文档']
+    assert names('icon:') == []
+    assert names('项目') == []
+
+    # 删除过半后重新拼接索引
+    model.remove(model.root.children['归档'])
+    model.add_child(model.root, '新文档')
+    assert names('文档') == ['新文档']
+
+
+@pytest.mark.parametrize('folders, expected', [
+    ({'COM{0..9}': {}}, ['COM1', 'COM9']),
+    ({'LPT{0..2}.txt': {}}, ['LPT1.txt', 'LPT2.txt']),
+    ({'a:b': {}}, ["a:b: 目录名包含非法字符 ':'"]),
+    ({'名称.': {}}, ['名称.: 目录名不能以空格或句点结尾']),
+    ({'Doc': {}, 'doc': {}}, ['doc: 与同级目录重名']),
+    ({'a{1..3}': {}, 'a2': {}}, ['a2: 与同级目录重名']),
+    ({'x' * 250: {}}, ['路径长度超过']),
+    ({'a': {'_icon': 'missing.png'}}, ['图标文件不存在 missing.png']),
+    ({'a': {'_icon': 1}}, ['_icon 不是文件路径']),
+])
+def test_validate_config_problems(tmp_path, folders, expected):
+    problems = main.validate_config(folders, str(tmp_path))
+    for text in expected:
+        assert any(text in problem for problem in problems), problems
+    assert main.validate_config(main.NodeStore.from_dict(folders), str(tmp_path)) == problems
+
+
+def test_validate_config_accepts_valid_config(tmp_path, icons):
+    assert main.validate_config(sample_folders(icons), str(tmp_path)) == []
+
+
+def test_invalid_config_is_rejected_before_any_change(tmp_path, icon_cache):
+    base = tmp_path / 'out'
+    with pytest.raises(main.PreflightError):
+        apply(base, {'ok': {}, 'bad?': {}}, icon_cache)
+    assert not base.exists()